@@ -9,6 +9,7 @@
 // Constructor
 AuctionServer::AuctionServer() {
     cout << "Starting auction server" << endl;
+    monitor_epoch = (unsigned long long)time(nullptr);
     if (!initializewinsock()) {
         exit(EXIT_FAILURE);
     }
@@ -141,6 +142,9 @@ void AuctionServer::manageclient(SOCKET client_socket) {
         if (status <= 0) {
             cout << "[DISCONNECT] Client disconnected.\n";
             if (!is_monitor) {
+                if (!client.auction_code.empty()) {
+                    broadcastToMonitor("[LEAVE] " + client.username + " left " + client.auction_code + "\n");
+                }
                 removeClient(client);
                 removeSocketFromList(client_socket);
             } else {
@@ -162,20 +166,9 @@ void AuctionServer::manageclient(SOCKET client_socket) {
 
         cout << "[RECV] " << msg << endl;
 
-        if (msg == "MONITOR_CLIENT") {
+        if (msg.rfind("MONITOR_CLIENT", 0) == 0) {
             is_monitor = true;
-            std::lock_guard<std::mutex> lock(clients_mutex);
-
-            if (monitor_socket != INVALID_SOCKET) {
-                cout << "[MONITOR] Replacing existing monitor client\n";
-                shutdown(monitor_socket, SD_BOTH);
-                closesocket(monitor_socket);
-            }
-
-            monitor_socket = client_socket;
-            cout << "[MONITOR] Monitor client registered\n";
-            string ack = "Monitor mode activated. You will receive all auction updates.\n";
-            send(client_socket, ack.c_str(), (int)ack.length(), 0);
+            registerMonitor(client_socket, msg);
             continue;
         }
 
@@ -183,6 +176,7 @@ void AuctionServer::manageclient(SOCKET client_socket) {
 
         if (msg == "LEAVE") {
             broadcastToRoom(client.auction_code, client.username + " left the auction.\n");
+            broadcastToMonitor("[LEAVE] " + client.username + " left " + client.auction_code + "\n");
             removeClient(client);
             removeSocketFromList(client_socket);
             break;
@@ -235,10 +229,54 @@ void AuctionServer::broadcastMessage(string &message, SOCKET avoid_socket) {
     }
 }
 
+// Registers the monitor client. "MONITOR_CLIENT <epoch> <last_seq>" resumes an earlier
+// session: the reply is "[RESUME] <epoch> <from_seq>", the backlogged events from from_seq on,
+// then "[RESUMED] <seq>". from_seq past last_seq + 1 means events were lost in between.
+void AuctionServer::registerMonitor(SOCKET client_socket, const string &request) {
+    unsigned long long epoch = 0, last_seq = 0;
+    istringstream args(request.substr(string("MONITOR_CLIENT").length()));
+    bool resuming = (bool)(args >> epoch >> last_seq);
+
+    std::lock_guard<std::mutex> lock(clients_mutex);
+    if (!resuming) {
+        last_seq = monitor_seq;  // a new monitor only gets live events
+    } else if (epoch != monitor_epoch) {
+        last_seq = 0;  // it followed an earlier server run: everything kept is new to it
+    }
+
+    if (monitor_socket != INVALID_SOCKET) {
+        cout << "[MONITOR] Replacing existing monitor client\n";
+        shutdown(monitor_socket, SD_BOTH);
+        closesocket(monitor_socket);
+    }
+
+    monitor_socket = client_socket;
+    cout << "[MONITOR] Monitor client registered, resuming after event " << last_seq << "\n";
+
+    // Sent under clients_mutex, so no live event can slip in between the resent ones
+    unsigned long long from_seq = monitor_seq + 1;
+    string replay;
+    for (auto &event : monitor_backlog) {
+        if (event.first <= last_seq) continue;
+        if (replay.empty()) from_seq = event.first;
+        replay += event.second;
+    }
+    string reply = "Monitor mode activated. You will receive all auction updates.\n";
+    reply += "[RESUME] " + to_string(monitor_epoch) + " " + to_string(from_seq) + "\n";
+    reply += replay;
+    reply += "[RESUMED] " + to_string(monitor_seq) + "\n";
+    send(client_socket, reply.c_str(), (int)reply.length(), 0);
+}
+
 void AuctionServer::broadcastToMonitor(const string &message) {
     std::lock_guard<std::mutex> lock(clients_mutex);
+    string event = "#" + to_string(++monitor_seq) + " " + message;
+    monitor_backlog.emplace_back(monitor_seq, event);
+    if (monitor_backlog.size() > MONITOR_BACKLOG) {
+        monitor_backlog.pop_front();
+    }
     if (monitor_socket != INVALID_SOCKET) {
-        int sent = send(monitor_socket, message.c_str(), (int)message.length(), 0);
+        int sent = send(monitor_socket, event.c_str(), (int)event.length(), 0);
         if (sent == SOCKET_ERROR) {
             cerr << "[MONITOR] Send failed with error: " << WSAGetLastError() << endl;
             shutdown(monitor_socket, SD_BOTH);
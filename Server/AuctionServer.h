@@ -16,6 +16,8 @@
 #include <thread>
 #include <mutex>
 #include <sstream>
+#include <deque>
+#include <ctime>
 
 // Windows socket headers (must come after standard headers)
 #include <winsock2.h>  // this library is for socket programming
@@ -26,6 +28,7 @@ using namespace std;
 //Defining constants here .
 #define PORT "8000"
 #define MAX_CLIENTS 10
+#define MONITOR_BACKLOG 10000 //monitor events kept for a reconnecting monitor client
 
 //represents a particular item on which auction is going to be held
 class AuctionItem
@@ -59,6 +62,10 @@ class AuctionServer
     map<string,vector<ClientInfo>>auction_rooms;
     SOCKET listen_socket=INVALID_SOCKET;
     SOCKET monitor_socket=INVALID_SOCKET;  
+    // Monitor events are sent as "#<seq> <line>"; seq restarts with every server run (epoch)
+    unsigned long long monitor_epoch=0;
+    unsigned long long monitor_seq=0;
+    deque<pair<unsigned long long,string>>monitor_backlog;
 
     bool initializewinsock();
     void cleanupwinsock();
@@ -70,6 +77,7 @@ class AuctionServer
     void removeClient(ClientInfo client);
     void broadcastToRoom(const string &auction_code, const string &message);
     void broadcastToMonitor(const string &message);  
+    void registerMonitor(SOCKET client_socket, const string &request);
     void removeSocketFromList(SOCKET client_socket); 
     vector<string> split(string &s,char delimiter);
 
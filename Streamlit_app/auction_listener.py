@@ -1,20 +1,91 @@
-import socket
 import asyncio
+import heapq
 import json
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
 import mysql.connector
-from datetime import datetime
-from pymongo import MongoClient
+from datetime import datetime, timezone
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 import websockets
-import re
 from mysql.connector import pooling
 import logging
+from collections import deque
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 import gridfs
 from bson import ObjectId
+from auction_protocol import parse_line, BidEvent, JoinEvent, LeaveEvent
+from listener_http import start_http_server, json_response, fetch_json
+from bid_wal import BidWAL
+from db_migrations import apply_migrations
+from image_cache import ImageCache, THUMBNAIL_SIZES, content_key, make_thumbnail, make_thumbnails
+from listener_logging import RateLimitedLogger, setup_logging
+from listener_metrics import counter, gauge, histogram, register_collector, render as render_metrics
     
 SERVER_IP = "127.0.0.1"
 SERVER_PORT = 8000
 WS_HOST = "0.0.0.0"
 WS_PORT = 8765
+# Local HTTP API serving the in-memory auction state to the UI
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 8766
+# How often auction_states is reconciled with MySQL for auctions created/closed by the UI
+AUCTION_RESYNC_INTERVAL = 10  # seconds
+# Codes that were not active when looked up (or whose lookup failed) are not
+# looked up again for this long, so stray events never stall ingest on the databases
+MISSING_AUCTION_TTL = 30  # seconds
+MISSING_AUCTIONS_MAX = 10000
+# Bids kept per auction for the snapshot sent to new WebSocket subscribers
+RECENT_BIDS = 20
+
+# Monitor reconnects back off exponentially with full jitter; the first retry is immediate
+MONITOR_RETRY_BASE = 0.5  # seconds
+MONITOR_RETRY_MAX = 30.0  # seconds
+
+# Monitor stream reads: large chunks so a burst of bid lines is parsed in one wakeup
+TCP_READ_SIZE = 64 * 1024
+TCP_MAX_LINE = 64 * 1024
+
+# Write-behind bid pipeline: ingest enqueues, bid_writer_loop persists in batches
+BID_QUEUE_MAX = 10000
+BID_FLUSH_SIZE = 500
+BID_FLUSH_INTERVAL = 0.05  # seconds
+MONGO_RETRY_LIMIT = 5
+BID_BUCKET_SIZE = 200
+MONGO_RETRY_INTERVAL = 1.0  # seconds
+# MongoDB error code of a unique index violation
+DUPLICATE_KEY = 11000
+
+# Every bid is appended to this local log before it is queued; bids the
+# databases have not confirmed are replayed from it
+WAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bid_wal")
+WAL_SEGMENT_BYTES = 4 * 1024 * 1024
+WAL_FSYNC_INTERVAL = 0.01  # seconds
+WAL_REPLAY_RETRY = 1.0  # seconds between replay attempts while a database is down
+
+# Per-client WebSocket send queue; a client this far behind is disconnected
+WS_SEND_QUEUE_MAX = 256
+# Subscribing to this room receives updates for every auction
+WS_ALL_ROOMS = "*"
+# Compact clients receive at most one conflated price frame per tick
+COMPACT_TICK = 0.25  # seconds
+
+# Fan-out tier: with WS_WORKERS > 0, that many worker processes share WS_PORT
+# (SO_REUSEPORT, Linux) and this process feeds them every update over the
+# WS_EVENT_SOCKET Unix socket instead of serving WebSocket clients itself
+WS_WORKERS = 0
+WS_EVENT_SOCKET = os.path.join(tempfile.gettempdir(), "auction_listener_events.sock")
+# Bytes buffered for a worker that stopped reading before it is disconnected
+WS_EVENT_BUFFER_MAX = 16 * 1024 * 1024
+WS_EVENT_RETRY = 0.5  # seconds between a worker's attempts to reach the feed
+# Snapshot fetches a worker retries when updates newer than the snapshot already passed
+WS_SNAPSHOT_ATTEMPTS = 3
 
 DB_CONFIG = {
     "host": "localhost",
@@ -26,10 +97,47 @@ DB_CONFIG = {
 }
 
 MONGO_URI = "mongodb://localhost:27017"
+# collection -> [(keys, create_index options)], created by ensure_mongo_indexes() at startup
+MONGO_INDEXES = {
+    "bid_buckets": [
+        ([("product_id", 1), ("count", 1)], {}),
+        ([("product_id", 1), ("first_ts", 1)], {}),
+    ],
+    # One waiting-room document and one bid summary per auction, both upserted
+    "waiting_room": [([("auction_code", 1)], {"unique": True})],
+    "active_auctions": [([("product_id", 1)], {"unique": True})],
+    "auction_history": [([("closed_at", -1)], {})],
+    "products": [([("seller", 1), ("status", 1)], {})],
+}
+MONGO_STATS_INTERVAL = 30  # seconds between samples of the server's collection-scan counters
+
+# Product images read from GridFS are kept on local disk, least recently used evicted first
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache")
+IMAGE_CACHE_BYTES = 256 * 1024 * 1024
+# Product fields list pages use; images are fetched per card with get_product_image()
+PRODUCT_LIST_FIELDS = {
+    "seller": 1, "name": 1, "description": 1, "base_price": 1, "status": 1, "auction_code": 1,
+    "sold_to": 1, "sold_price": 1, "sold_at": 1, "image_file_id": 1, "image_key": 1, "thumbnails": 1,
+}
+
+# run_db() warns about calls slower than this
+DB_SLOW_CALL_MS = 200
+# Log category -> (records per second, burst); the rest are counted and dropped
+LOG_RATE_LIMITS = {
+    "monitor": (10, 50),
+    "bids": (5, 20),
+    "ws": (5, 20),
+    "db": (2, 10),
+}
 
 # Setup logging 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 log = logging.getLogger(__name__)
+# Per-message log categories, rate-limited according to LOG_RATE_LIMITS
+monitor_log = RateLimitedLogger(log.getChild("monitor"), *LOG_RATE_LIMITS["monitor"])
+bids_log = RateLimitedLogger(log.getChild("bids"), *LOG_RATE_LIMITS["bids"])
+ws_log = RateLimitedLogger(log.getChild("ws"), *LOG_RATE_LIMITS["ws"])
+db_log = RateLimitedLogger(log.getChild("db"), *LOG_RATE_LIMITS["db"])
 
 #MongoDB 
 mongo_client = MongoClient(MONGO_URI)
@@ -39,8 +147,98 @@ history_col = mongo_db["auction_history"]
 products_col = mongo_db["products"]
 fs = gridfs.GridFS(mongo_db)
 waiting_col = mongo_db["waiting_room"]
+# Created by get_image_cache() on first use, so processes that never serve images never scan it
+image_cache = None
+_image_cache_lock = threading.Lock()
+# Bids live in fixed-size bucket documents: {product_id, count, bids[], first_ts, last_ts}
+bid_buckets_col = mongo_db["bid_buckets"]
 #MySQL connection pool 
 connection_pool = None
+# Blocking DB calls from coroutines go through run_db(); one thread per pooled
+# MySQL connection so get_connection() never finds the pool exhausted
+db_executor = ThreadPoolExecutor(max_workers=DB_CONFIG["pool_size"], thread_name_prefix="db")
+# call name -> {calls, total_ms, max_ms, last_ms}
+db_timings = {}
+# (collection, index name) -> "ready" or the error that stopped the build
+mongo_index_status = {}
+# serverStatus metrics.queryExecutor.collectionScans: {"total": n, "nonTailable": n}
+mongo_scan_stats = {}
+
+# auction_code -> AuctionState for every active auction; dropped when the auction closes
+auction_states = {}
+# auction_code -> time.monotonic() until which get_auction_state() answers None without a lookup
+missing_auctions = {}
+# (deadline, auction_code) min-heap; entries whose state is gone or whose deadline
+# changed are skipped when they reach the top instead of being removed in place
+deadline_heap = []
+deadline_wakeup = None
+# auction_code -> AuctionState of auctions being closed by the deadline scheduler
+closing_auctions = {}
+# Running close_due_auctions() tasks; the event loop only keeps weak references
+closing_tasks = set()
+# auction_code -> bids queued but not yet flushed; closure waits for these
+unflushed_bids = {}
+
+# Monitor stream position: the server numbers its events "#<seq> <line>", restarting
+# at 1 with every server run (epoch); None until a server that numbers them is seen
+monitor_epoch = None
+monitor_last_seq = 0
+# True between the server's [RESUME] and [RESUMED] lines, while it resends missed events
+monitor_resuming = False
+
+bid_queue = None
+bid_wal = None
+# (lsn, update) broadcasts held until the WAL is fsynced through lsn; see publish_update()
+held_updates = deque()
+# Set when a bid could not be queued or written; bid_writer_loop then replays the WAL
+wal_replay_requested = False
+# Failed Mongo writes as (attempts, collection, bid or summary), resent with the next flush
+mongo_retry_ops = []
+mongo_stats = {
+    "batches": 0,
+    "last_batch_size": 0,
+    "last_batch_ms": 0.0,
+    "failed_ops": 0,
+    "retried_ops": 0,
+    "dropped_ops": 0,
+}
+pipeline_stats = {
+    "flushes": 0,
+    "flushed_bids": 0,
+    "last_flush_size": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "overflowed_bids": 0,
+    "failed_flushes": 0,
+    "replays": 0,
+    "replayed_bids": 0,
+    # MySQL rows that already held a bid at least as high as the one written
+    "stale_bid_writes": 0,
+}
+
+# Prometheus metrics for the bid hot path, served at /metrics
+metric_lines = counter("listener_monitor_lines_total", "Lines read from the auction server")
+metric_bids = counter("listener_bids_total", "Bids accepted for an active auction")
+metric_rejected_bids = counter("listener_bids_rejected_total", "Bids dropped for not beating the auction's current bid")
+metric_reconnects = counter("listener_monitor_reconnects_total", "Reconnections to the auction server")
+metric_reconcile = histogram(
+    "listener_monitor_reconcile_seconds", "Time from reconnecting to the auction server until missed events are backfilled"
+)
+metric_replayed_events = counter("listener_monitor_replayed_events_total", "Monitor events resent by the server after a reconnect")
+metric_missed_events = counter("listener_monitor_missed_events_total", "Monitor events lost across a reconnect")
+metric_server_restarts = counter(
+    "listener_monitor_server_restarts_total",
+    "Reconnects that found a restarted auction server; events of its previous run are lost in unknown number"
+)
+metric_parse = histogram("listener_parse_seconds", "Time to parse one monitor line")
+metric_db_write = {
+    store: histogram("listener_db_write_seconds", "Time to write one flush window of bids", store=store)
+    for store in ("mysql", "mongo")
+}
+metric_bid_persisted = histogram(
+    "listener_bid_persist_latency_seconds", "Time from reading a bid line to its flush completing"
+)
+metric_fanout = histogram("listener_ws_fanout_seconds", "Time to queue one update for its WebSocket subscribers")
 
 
 def add_to_waiting_room(auction_code: str, username: str):
@@ -90,6 +288,12 @@ def clear_waiting_room(auction_code: str):
     except Exception as e:
         log.error(f"Failed to clear waiting room {auction_code} : {e}")
 
+def clear_waiting_rooms(auction_codes):
+    try:
+        waiting_col.delete_many({"auction_code": {"$in": list(auction_codes)}})
+    except Exception as e:
+        log.error(f"Failed to clear waiting rooms {auction_codes} : {e}")
+
 def init_db_pool():
     global connection_pool
     if connection_pool is None:
@@ -101,119 +305,817 @@ def get_db_connection():
         init_db_pool()
     return connection_pool.get_connection()
 
-def update_current_bid_by_code(new_bid: float, bidder_id: str, auction_code: str):
+def apply_db_migrations():
+    conn = get_db_connection()
+    try:
+        apply_migrations(conn)
+    except Exception as e:
+        log.error(f"Could not apply MySQL schema migrations: {e}")
+    finally:
+        conn.close()
+
+async def run_db(name: str, fn, *args):
+    """
+    Runs a blocking MySQL/Mongo call on db_executor so the event loop keeps
+    serving WebSockets, and records its timing under `name`.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(db_executor, fn, *args)
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        timing = db_timings.get(name)
+        if timing is None:
+            timing = db_timings[name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+        timing["calls"] += 1
+        timing["total_ms"] += elapsed_ms
+        timing["last_ms"] = round(elapsed_ms, 2)
+        timing["max_ms"] = max(timing["max_ms"], timing["last_ms"])
+        if elapsed_ms >= DB_SLOW_CALL_MS:
+            db_log.warning("Slow database call %s: %.0f ms", name, elapsed_ms)
+
+def get_db_stats():
+    return {
+        name: dict(timing, total_ms=round(timing["total_ms"], 2), avg_ms=round(timing["total_ms"] / timing["calls"], 2))
+        for name, timing in db_timings.items()
+    }
+
+def update_current_bids(latest_bids: dict):
+    """
+    Applies {auction_code: (bid, bidder)} to MySQL over one connection and one commit.
+    A bid only replaces a lower stored one, so a late or replayed write never
+    moves current_bid backwards. Returns the codes that no longer have an
+    active row; raises if MySQL fails.
+    """
+    closed = []
+    if not latest_bids:
+        return closed
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE auctions
-            SET current_bid=%s, current_bidder=%s, last_update=UTC_TIMESTAMP()
-            WHERE auction_code=%s AND status='active'
-        """, (new_bid, bidder_id, auction_code))
+    except Exception as e:
+        log.error(f"Error updating bids in MySQL for {list(latest_bids)}: {e}")
+        raise
+    cursor = conn.cursor()
+    try:
+        unchanged = []
+        for auction_code, (new_bid, bidder_id) in latest_bids.items():
+            cursor.execute("""
+                UPDATE auctions
+                SET current_bid=%s, current_bidder=%s, last_update=UTC_TIMESTAMP()
+                WHERE auction_code=%s AND status='active'
+                  AND (current_bid IS NULL OR current_bid < %s)
+            """, (new_bid, bidder_id, auction_code, new_bid))
+            if cursor.rowcount == 0:
+                unchanged.append(auction_code)
+        if unchanged:
+            # Either the auction was closed elsewhere or it already holds a higher bid
+            placeholders = ", ".join(["%s"] * len(unchanged))
+            cursor.execute(
+                f"SELECT auction_code FROM auctions WHERE status='active' AND auction_code IN ({placeholders})",
+                unchanged
+            )
+            active = {row[0] for row in cursor.fetchall()}
+            closed = [auction_code for auction_code in unchanged if auction_code not in active]
+            pipeline_stats["stale_bid_writes"] += len(unchanged) - len(closed)
         conn.commit()
+    except Exception as e:
+        log.error(f"Error updating bids in MySQL for {list(latest_bids)}: {e}")
+        raise
+    finally:
+        # Always hand the connection back, or a few failed flushes exhaust the pool
         cursor.close()
         conn.close()
-    except Exception as e:
-        log.error(f"Error updating bid in MySQL for {auction_code}: {e}")
+    return closed
+
+class AuctionState:
+    """
+    Live record of one active auction. The listener sees every bid first, so
+    current_bid/current_bidder here are ahead of MySQL by at most one flush.
+    A bid is applied here as soon as it is appended to the WAL, since the next
+    bid is checked against it, so snapshot(), to_dict() and the HTTP API may
+    show a bid up to one WAL_FSYNC_INTERVAL before it is durable; only the
+    bid_update broadcasts wait for the fsync (see publish_update()). seq numbers the WebSocket events sent for this auction, so a client can
+    line incremental updates up with the snapshot it got on subscribe.
+    """
+    __slots__ = (
+        "auction_id", "auction_code", "product_id", "product_name", "base_price",
+        "current_bid", "current_bidder", "start_time", "duration_minutes",
+        "deadline", "occupants", "waiting", "seq", "recent_bids", "loaded_at"
+    )
+
+    def __init__(self, row):
+        self.auction_code = row["auction_code"]
+        self.occupants = set()
+        self.current_bid = None
+        self.current_bidder = None
+        self.waiting = 0
+        self.seq = 0
+        # (bid, bidder, iso timestamp), oldest first
+        self.recent_bids = deque(maxlen=RECENT_BIDS)
+        # time.monotonic() when the state was created; see apply_auction_rows()
+        self.loaded_at = time.monotonic()
+        self.update_from_row(row)
+
+    def update_from_row(self, row):
+        self.auction_id = row["id"]
+        self.product_id = row["product_id"]
+        self.product_name = row.get("product_name")
+        self.base_price = float(row["base_price"]) if row.get("base_price") is not None else None
+        start = row.get("start_time")
+        if isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        self.start_time = start
+        self.duration_minutes = int(row.get("duration_minutes") or 0)
+        self.deadline = (
+            start.replace(tzinfo=timezone.utc).timestamp() + self.duration_minutes * 60 if start else None
+        )
+        # Our in-memory bid can only be ahead of the stored one
+        stored_bid = row.get("current_bid")
+        if stored_bid is not None and (self.current_bid is None or float(stored_bid) > self.current_bid):
+            self.current_bid = float(stored_bid)
+            self.current_bidder = row.get("current_bidder")
+
+    def to_dict(self):
+        return {
+            "id": self.auction_id,
+            "auction_code": self.auction_code,
+            "product_id": self.product_id,
+            "product_name": self.product_name,
+            "base_price": self.base_price,
+            "current_bid": self.current_bid,
+            "current_bidder": self.current_bidder,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "duration_minutes": self.duration_minutes,
+            "deadline": self.deadline,
+            "occupancy": len(self.occupants),
+            "waiting": self.waiting,
+            "status": "active",
+        }
 
-def get_product_id_by_code(auction_code: str):
+    def snapshot(self):
+        return {
+            "auction_code": self.auction_code,
+            "seq": self.seq,
+            "current_bid": self.current_bid,
+            "current_bidder": self.current_bidder,
+            "base_price": self.base_price,
+            "deadline": self.deadline,
+            "occupancy": len(self.occupants),
+            "recent_bids": [
+                {"bid": bid, "bidder": bidder, "timestamp": ts} for bid, bidder, ts in self.recent_bids
+            ],
+        }
+
+def fetch_active_auction_rows(auction_codes=None, recent_bids=False):
+    """
+    Reads active auctions from MySQL (all of them, or only auction_codes) and
+    folds in what Mongo knows: the latest logged bid, the waiting-room size and,
+    with recent_bids=True, the last RECENT_BIDS bids from bid_buckets.
+    Runs on db_executor; the result is applied on the event loop by apply_auction_rows().
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT product_id FROM auctions WHERE auction_code=%s AND status='active' LIMIT 1", (auction_code,))
-        row = cursor.fetchone()
+        query = """
+            SELECT id, auction_code, product_id, product_name, base_price, current_bid,
+                   current_bidder, start_time, duration_minutes
+            FROM auctions WHERE status='active'
+        """
+        if auction_codes is None:
+            cursor.execute(query)
+        else:
+            placeholders = ",".join(["%s"] * len(auction_codes))
+            cursor.execute(query + f" AND auction_code IN ({placeholders})", tuple(auction_codes))
+        rows = [row for row in cursor.fetchall() if row.get("auction_code")]
+    finally:
         cursor.close()
         conn.close()
-        return row[0] if row else None
+    if not rows:
+        return rows
+
+    try:
+        by_product = {str(row["product_id"]): row for row in rows}
+        for summary in active_col.find(
+            {"product_id": {"$in": list(by_product)}},
+            {"product_id": 1, "last_bid": 1, "last_bidder": 1}
+        ):
+            row = by_product.get(summary["product_id"])
+            last_bid = summary.get("last_bid")
+            if row and last_bid is not None and (row["current_bid"] is None or last_bid > float(row["current_bid"])):
+                row["current_bid"] = last_bid
+                row["current_bidder"] = summary.get("last_bidder")
+
+        by_code = {row["auction_code"]: row for row in rows}
+        for room in waiting_col.find({"auction_code": {"$in": list(by_code)}}, {"auction_code": 1, "users": 1}):
+            by_code[room["auction_code"]]["waiting"] = len(room.get("users", []))
+
+        if recent_bids:
+            # Newest bucket first; one bucket holds far more than RECENT_BIDS bids
+            for bucket in bid_buckets_col.find(
+                {"product_id": {"$in": list(by_product)}},
+                {"product_id": 1, "bids": {"$slice": -RECENT_BIDS}}
+            ).sort("last_ts", -1):
+                row = by_product.get(bucket["product_id"])
+                if row is not None and "recent_bids" not in row:
+                    row["recent_bids"] = [
+                        (float(b["amount"]), b["bidder"], b["timestamp"].isoformat()) for b in bucket.get("bids", [])
+                    ]
     except Exception as e:
-        log.warning(f"Error looking up auction_code {auction_code}: {e}")
-        return None
+        log.warning(f"Could not merge MongoDB state into auction records: {e}")
+    return rows
+
+def apply_auction_rows(rows, fetched_at=None):
+    """
+    Merges fetched rows into auction_states. With fetched_at, the time.monotonic()
+    at which the fetch started, the rows are every active auction, so records
+    missing from them have closed and are dropped; records loaded on demand
+    after fetched_at are kept, since the fetch may predate their INSERT.
+    """
+    for row in rows:
+        if row["auction_code"] in closing_auctions:
+            continue
+        state = auction_states.get(row["auction_code"])
+        if state is None:
+            missing_auctions.pop(row["auction_code"], None)
+            state = auction_states[row["auction_code"]] = AuctionState(row)
+            schedule_deadline(state)
+        else:
+            deadline = state.deadline
+            state.update_from_row(row)
+            if state.deadline != deadline:
+                schedule_deadline(state)
+        if "waiting" in row:
+            state.waiting = row["waiting"]
+        if row.get("recent_bids") and not state.recent_bids:
+            state.recent_bids.extend(row["recent_bids"])
+    if fetched_at is not None:
+        active_codes = {row["auction_code"] for row in rows}
+        for auction_code in [
+            code for code, state in auction_states.items() if code not in active_codes and state.loaded_at < fetched_at
+        ]:
+            evict_auction_state(auction_code)
+
+async def load_auction_states(recent_bids=False):
+    fetched_at = time.monotonic()
+    rows = await run_db("load_auction_states", fetch_active_auction_rows, None, recent_bids)
+    apply_auction_rows(rows, fetched_at)
+    log.info(f"Loaded {len(auction_states)} active auctions into memory")
+
+async def get_auction_state(auction_code: str):
+    """
+    Returns the AuctionState for auction_code, loading it from the databases
+    on a miss; None if there is no such active auction. A miss is remembered
+    for MISSING_AUCTION_TTL; auction_resync_loop still picks the code up if it
+    turns up in MySQL meanwhile.
+    """
+    state = auction_states.get(auction_code)
+    if state is None and auction_code not in closing_auctions:
+        if missing_auctions.get(auction_code, 0) > time.monotonic():
+            return None
+        try:
+            rows = await run_db("load_auction_state", fetch_active_auction_rows, [auction_code], True)
+        except Exception as e:
+            log.warning(f"Error looking up auction_code {auction_code}: {e}")
+            remember_missing_auction(auction_code)
+            return None
+        apply_auction_rows(rows)
+        state = auction_states.get(auction_code)
+        if state is None:
+            remember_missing_auction(auction_code)
+    return state
+
+def remember_missing_auction(auction_code: str):
+    now = time.monotonic()
+    if len(missing_auctions) >= MISSING_AUCTIONS_MAX:
+        for code in [code for code, expires in missing_auctions.items() if expires <= now]:
+            del missing_auctions[code]
+        if len(missing_auctions) >= MISSING_AUCTIONS_MAX:
+            # Flooded with distinct codes: forget the oldest half
+            for code in list(missing_auctions)[:MISSING_AUCTIONS_MAX // 2]:
+                del missing_auctions[code]
+    missing_auctions[auction_code] = now + MISSING_AUCTION_TTL
+
+def evict_auction_state(auction_code: str):
+    if auction_states.pop(auction_code, None) is not None:
+        remember_missing_auction(auction_code)
+
+async def auction_resync_loop():
+    """
+    Picks up auctions created or closed by the UI that the bid stream has not mentioned.
+    """
+    while True:
+        await asyncio.sleep(AUCTION_RESYNC_INTERVAL)
+        try:
+            await load_auction_states()
+        except Exception as e:
+            log.warning(f"Auction state resync failed: {e}")
+
+def schedule_deadline(state: AuctionState):
+    """
+    Queues state for closure at state.deadline. Rescheduling just pushes a new
+    entry; the old one no longer matches state.deadline and is skipped.
+    """
+    if state.deadline is None:
+        return
+    heapq.heappush(deadline_heap, (state.deadline, state.auction_code))
+    if len(deadline_heap) > 2 * len(auction_states) + 1024:
+        # Mostly stale entries: rebuild from the live states
+        deadline_heap[:] = [(st.deadline, code) for code, st in auction_states.items() if st.deadline is not None]
+        heapq.heapify(deadline_heap)
+    if deadline_wakeup is not None and deadline_heap[0][1] == state.auction_code:
+        deadline_wakeup.set()
 
-def log_bid_to_mongo(product_id, bidder, bid_value):
+def close_auction_records(closings, conn=None):
+    """
+    Closes many auctions in a fixed number of round trips: marks them closed in
+    MySQL, finalizes them in MongoDB, deletes the rows and clears the waiting rooms.
+    closings holds (auction_id, auction_code, product_id, winner, final_bid)
+    tuples; returns the ones that were still active (the rest were closed elsewhere).
+    conn defaults to a pooled connection and is closed when done.
+    """
+    if not closings:
+        return []
+    conn = conn or get_db_connection()
+    cursor = conn.cursor()
     try:
-        # ensure numeric type for MongoDB storage
+        ids = tuple(closing[0] for closing in closings)
+        cursor.execute(
+            f"SELECT id FROM auctions WHERE id IN ({','.join(['%s'] * len(ids))}) AND status='active' FOR UPDATE",
+            ids
+        )
+        active_ids = {row[0] for row in cursor.fetchall()}
+        closings = [closing for closing in closings if closing[0] in active_ids]
+        if not closings:
+            conn.commit()
+            return []
+
+        ids = tuple(closing[0] for closing in closings)
+        placeholders = ",".join(["%s"] * len(ids))
+        cases = " ".join(["WHEN %s THEN %s"] * len(closings))
+        cursor.execute(f"""
+            UPDATE auctions
+            SET status='closed', end_time=%s,
+                final_bid=CASE id {cases} END,
+                winner=CASE id {cases} END
+            WHERE id IN ({placeholders})
+        """, (
+            datetime.utcnow(),
+            *[value for auction_id, _, _, _, final_bid in closings for value in (auction_id, final_bid)],
+            *[value for auction_id, _, _, winner, _ in closings for value in (auction_id, winner)],
+            *ids
+        ))
+        conn.commit()
+
+        finalize_mongo_auctions([(product_id, winner, final_bid) for _, _, product_id, winner, final_bid in closings])
+
+        cursor.execute(f"DELETE FROM auctions WHERE id IN ({placeholders})", ids)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    clear_waiting_rooms([auction_code for _, auction_code, _, _, _ in closings])
+    return closings
+
+async def close_due_auctions(states):
+    """
+    Closes auctions that deadline_loop() has moved from auction_states to
+    closing_auctions, so new bids are refused; those already queued are
+    flushed before the results are written.
+    """
+    try:
+        while any(unflushed_bids.get(state.auction_code) for state in states):
+            await asyncio.sleep(BID_FLUSH_INTERVAL)
+
+        closings = [
+            (
+                state.auction_id, state.auction_code, state.product_id,
+                state.current_bidder or "No Bids",
+                state.current_bid if state.current_bid is not None else (state.base_price or 0.0)
+            )
+            for state in states
+        ]
+        closed = await run_db("close_auctions", close_auction_records, closings)
+    except Exception as e:
+        # The resync picks the auctions up again and their deadlines fire right away
+        log.error(f"Failed to close {len(states)} auctions: {e}")
+        return
+    finally:
+        for state in states:
+            closing_auctions.pop(state.auction_code, None)
+
+    by_code = {state.auction_code: state for state in states}
+    for _, auction_code, product_id, winner, final_bid in closed:
+        state = by_code[auction_code]
+        log.info("Closed auction %s | Winner: %s | Final Bid: %s", auction_code, winner, final_bid)
+        state.seq += 1
+        await publish_update({
+            "type": "auction_closed",
+            "auction_code": auction_code,
+            "product_id": product_id,
+            "winner": winner,
+            "final_bid": final_bid,
+            "seq": state.seq,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    if len(closed) < len(states):
+        log.info(f"{len(states) - len(closed)} auctions were already closed")
+
+async def deadline_loop():
+    """
+    Sleeps until the earliest deadline in deadline_heap, or until
+    schedule_deadline() pushes an earlier one, and closes what is due.
+    """
+    while True:
+        due = []
+        while deadline_heap:
+            deadline, auction_code = deadline_heap[0]
+            state = auction_states.get(auction_code)
+            if state is None or state.deadline != deadline:
+                heapq.heappop(deadline_heap)
+            elif deadline <= time.time():
+                heapq.heappop(deadline_heap)
+                evict_auction_state(auction_code)
+                closing_auctions[auction_code] = state
+                due.append(state)
+            else:
+                break
+        if due:
+            # Auctions expiring together are closed as one batch
+            task = asyncio.create_task(close_due_auctions(due))
+            closing_tasks.add(task)
+            task.add_done_callback(closing_tasks.discard)
+
+        deadline_wakeup.clear()
+        timeout = deadline_heap[0][0] - time.time() if deadline_heap else None
         try:
-            bid_amount = float(bid_value)
-        except Exception:
-            # if it was Decimal or malformed, coerce via str->float as last resort
-            bid_amount = float(str(bid_value))
+            await asyncio.wait_for(deadline_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
 
-        bid_entry = {
-            "bidder": str(bidder),
-            "amount": bid_amount,
-            "timestamp": datetime.utcnow()
-        }
+def state_api(path_parts, query):
+    """
+    GET /auctions               every active auction
+    GET /auctions/<code>        one auction by code (loaded from the databases on a miss)
+    GET /auctions/id/<id>       one auction by MySQL id
+    """
+    if len(path_parts) == 1:
+        return json_response({"auctions": [state.to_dict() for state in auction_states.values()]})
+    if len(path_parts) == 3 and path_parts[1] == "id":
+        for state in auction_states.values():
+            if str(state.auction_id) == path_parts[2]:
+                return json_response(state.to_dict())
+        return json_response({"error": "not found"}, 404)
+    if len(path_parts) == 2:
+        return _state_by_code(path_parts[1])
+    return json_response({"error": "not found"}, 404)
+
+def snapshot_api(path_parts, query):
+    """
+    GET /snapshots/<code>       {"auctions": [snapshot]} as sent to new WebSocket subscribers
+    GET /snapshots/*            snapshots of every active auction
+    """
+    if len(path_parts) != 2:
+        return json_response({"error": "not found"}, 404)
+    return _snapshots(path_parts[1])
+
+def closed_api(path_parts, query):
+    """
+    GET /closed/<code>?winner=<bidder>&final_bid=<amount>
+        the UI closed the auction itself (End Early, or its own expiry sweep):
+        drop it from memory and send its subscribers auction_closed
+    """
+    if len(path_parts) != 2:
+        return json_response({"error": "not found"}, 404)
+    return _auction_closed_elsewhere(path_parts[1], query)
 
-        active_col.update_one(
-            {"product_id": product_id},
+async def _auction_closed_elsewhere(auction_code, query):
+    state = auction_states.get(auction_code)
+    if state is None:
+        # Never loaded, already evicted, or being closed by deadline_loop, which announces it
+        if auction_code not in closing_auctions:
+            remember_missing_auction(auction_code)
+        return json_response({"closed": False})
+    evict_auction_state(auction_code)
+    winner = query.get("winner", [state.current_bidder or "No Bids"])[0]
+    try:
+        final_bid = float(query["final_bid"][0])
+    except (KeyError, ValueError):
+        final_bid = state.current_bid if state.current_bid is not None else (state.base_price or 0.0)
+    log.info("Auction %s was closed by the UI | Winner: %s | Final Bid: %s", auction_code, winner, final_bid)
+    state.seq += 1
+    await publish_update({
+        "type": "auction_closed",
+        "auction_code": auction_code,
+        "product_id": state.product_id,
+        "winner": winner,
+        "final_bid": final_bid,
+        "seq": state.seq,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+    return json_response({"closed": True})
+
+async def _snapshots(auction_code):
+    return json_response({"auctions": await auction_snapshots(auction_code)})
+
+async def _state_by_code(auction_code):
+    state = await get_auction_state(auction_code)
+    if state is None:
+        return json_response({"error": "not found"}, 404)
+    return json_response(state.to_dict())
+
+def _bid_amount(bid_value):
+    # ensure numeric type for MongoDB storage
+    try:
+        return float(bid_value)
+    except Exception:
+        # if it was Decimal or malformed, coerce via str->float as last resort
+        return float(str(bid_value))
+
+def log_bids_to_mongo(bids, skip_logged=False):
+    """
+    Logs [(product_id, bidder, bid_value, timestamp, lsn), ...] with one unordered
+    bulk_write per collection: each bid is pushed into the product's open
+    bucket in bid_buckets and active_auctions keeps only a per-product summary.
+    Bids and summaries that fail are kept in mongo_retry_ops and resent with the
+    next batch; returns how many were dropped after MONGO_RETRY_LIMIT attempts.
+    A failed write may still have been applied, so resends are idempotent: a
+    retried bid is skipped when its lsn is already in a bucket, and a summary
+    carries the lsns of its bids, see _summary_op(). With skip_logged=True (the
+    WAL replay, which also stands in for retries it cleared) every bid is
+    checked against the buckets, and the summaries are rebuilt from every bid
+    past the product's stored last_lsn, logged or not.
+    """
+    now = datetime.utcnow()
+    retries, mongo_retry_ops[:] = mongo_retry_ops[:], []
+    retried_bids = [(attempts, bid) for attempts, col, bid in retries if col is bid_buckets_col]
+    retried_summaries = [(attempts, summary) for attempts, col, summary in retries if col is active_col]
+
+    failed = []
+    try:
+        logged = _logged_lsns([bid for _, bid in retried_bids] + (list(bids) if skip_logged else []))
+    except Exception:
+        if skip_logged:
+            raise
+        bids_log.warning("Could not check %d retried bids against bid_buckets; retrying later", len(retried_bids))
+        failed.extend((attempts, bid_buckets_col, bid, None) for attempts, bid in retried_bids)
+        retried_bids, logged = [], set()
+    summarized = _summarized_lsns({bid[0] for bid in bids}) if skip_logged and bids else {}
+
+    bucket_ops = []
+    summaries = {}
+    for attempts, (product_id, bidder, bid_value, timestamp, lsn) in retried_bids + [(0, bid) for bid in bids]:
+        already_logged = lsn is not None and lsn in logged
+        if already_logged and (attempts or lsn <= summarized.get(product_id, 0)):
+            continue
+        try:
+            bid_entry = {
+                "bidder": str(bidder),
+                "amount": _bid_amount(bid_value),
+                "timestamp": timestamp or now
+            }
+        except Exception as e:
+            bids_log.warning("Skipping malformed bid for %s: %s (%s)", product_id, bid_value, e)
+            continue
+        if lsn is not None:
+            bid_entry["lsn"] = lsn
+        if already_logged:
+            # In a bucket, but a crash or a cleared retry may have lost its summary
+            _add_to_summary(summaries, product_id, bid_entry, lsn)
+            continue
+        # Fills the current bucket; once it holds BID_BUCKET_SIZE bids the filter
+        # no longer matches and the upsert opens the next one
+        bucket_ops.append((attempts, bid_buckets_col, (product_id, bidder, bid_value, timestamp, lsn), UpdateOne(
+            {"product_id": product_id, "count": {"$lt": BID_BUCKET_SIZE}},
             {
                 "$push": {"bids": bid_entry},
-                "$set": {
-                    "last_bid": bid_amount,
-                    "last_bidder": str(bidder),
-                    "last_update": datetime.utcnow()
-                }
+                "$inc": {"count": 1},
+                "$min": {"first_ts": bid_entry["timestamp"]},
+                "$max": {"last_ts": bid_entry["timestamp"]}
             },
             upsert=True
+        )))
+        if attempts:
+            # Its summary went out with the batch it first came in
+            continue
+        if lsn is None or lsn > summarized.get(product_id, 0):
+            _add_to_summary(summaries, product_id, bid_entry, lsn)
+
+    summary_ops = []
+    # Later summaries of a product wait until the earlier one is written,
+    # so each is applied exactly once and in lsn order
+    waiting = []
+    sent = set()
+    for attempts, summary in retried_summaries + [(0, (product_id,) + summary) for product_id, summary in summaries.items()]:
+        if summary[0] in sent:
+            waiting.append((attempts, active_col, summary))
+            continue
+        sent.add(summary[0])
+        summary_ops.append((attempts, active_col, summary, _summary_op(summary, now)))
+
+    ops = bucket_ops + summary_ops
+    if not ops and not failed:
+        mongo_retry_ops.extend(waiting)
+        return 0
+
+    started = time.perf_counter()
+    for col, col_ops in ((bid_buckets_col, bucket_ops), (active_col, summary_ops)):
+        if col_ops:
+            failed.extend(_bulk_write(col, col_ops))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    dropped = 0
+    for attempts, col, item, _ in failed:
+        if attempts + 1 >= MONGO_RETRY_LIMIT:
+            dropped += 1
+            mongo_stats["dropped_ops"] += 1
+            bids_log.error("Dropping MongoDB bid operation on %s after %d attempts: %s", col.name, MONGO_RETRY_LIMIT, item)
+        else:
+            mongo_retry_ops.append((attempts + 1, col, item))
+    mongo_retry_ops.extend(waiting)
+
+    mongo_stats["batches"] += 1
+    mongo_stats["last_batch_size"] = len(ops)
+    mongo_stats["last_batch_ms"] = round(elapsed_ms, 2)
+    mongo_stats["failed_ops"] += len(failed)
+    mongo_stats["retried_ops"] += len(retries)
+    bids_log.info("MongoDB logged %d bids for %d products in %.1f ms", len(bucket_ops), len(summaries), elapsed_ms)
+    return dropped
+
+def _add_to_summary(summaries, product_id, bid_entry, lsn):
+    count, _, _, first_lsn, _ = summaries.get(product_id, (0, None, None, lsn, None))
+    if lsn is None or first_lsn is None:
+        first_lsn = None
+    summaries[product_id] = (count + 1, bid_entry["amount"], bid_entry["bidder"], first_lsn, lsn)
+
+def _summarized_lsns(product_ids):
+    """Returns {product_id: last_lsn} of the summaries in active_auctions."""
+    return {
+        summary["product_id"]: summary["last_lsn"]
+        for summary in active_col.find(
+            {"product_id": {"$in": list(product_ids)}, "last_lsn": {"$exists": True}},
+            {"product_id": 1, "last_lsn": 1}
         )
-        log.info(f"MongoDB updated for {product_id}: {bidder} → {bid_amount}")
+    }
+
+def _logged_lsns(bids):
+    """Returns the lsns among bids that are already in a bid_buckets document."""
+    lsns = [bid[4] for bid in bids if bid[4] is not None]
+    logged = set()
+    if not lsns:
+        return logged
+    for bucket in bid_buckets_col.find(
+        {"product_id": {"$in": list({bid[0] for bid in bids})}, "bids.lsn": {"$gte": min(lsns), "$lte": max(lsns)}},
+        {"bids.lsn": 1}
+    ):
+        logged.update(entry.get("lsn") for entry in bucket.get("bids", []))
+    return logged
+
+def _summary_op(summary, now):
+    """
+    Upserts one (product_id, count, last_bid, last_bidder, first_lsn, last_lsn)
+    summary. The filter only matches while the stored last_lsn is below
+    first_lsn, so once the summary is in, a resend falls through to an insert
+    that the unique product_id index rejects, which _bulk_write counts as done.
+    """
+    product_id, count, amount, bidder, first_lsn, last_lsn = summary
+    query = {"product_id": product_id}
+    update = {
+        "$set": {"last_bidder": bidder},
+        "$max": {"last_bid": amount, "last_update": now},
+        "$inc": {"bid_count": count}
+    }
+    if first_lsn is not None:
+        query["last_lsn"] = {"$not": {"$gte": first_lsn}}
+        update["$set"]["last_lsn"] = last_lsn
+    return UpdateOne(query, update, upsert=True)
+
+def _bulk_write(col, entries):
+    """
+    Runs one unordered bulk_write of (attempts, collection, item, operation)
+    entries and returns those whose operation failed. A duplicate key error is
+    a summary that was already applied (see _summary_op), not a failure.
+    """
+    try:
+        col.bulk_write([op for *_, op in entries], ordered=False)
+    except BulkWriteError as e:
+        failed_indexes = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+        if failed_indexes:
+            bids_log.warning("MongoDB bulk write on %s: %d/%d operations failed", col.name, len(failed_indexes), len(entries))
+        return [entries[i] for i in sorted(failed_indexes)]
+    except Exception as e:
+        bids_log.error("MongoDB bulk write on %s failed for %d operations: %s", col.name, len(entries), e)
+        return entries
+    return []
+
+def get_bid_history(product_ids):
+    """
+    Returns {product_id: [bid, ...]} (oldest first) from bid_buckets for many products in one query.
+    """
+    history = {}
+    try:
+        cursor = bid_buckets_col.find(
+            {"product_id": {"$in": list(product_ids)}},
+            {"product_id": 1, "bids": 1}
+        ).sort([("product_id", 1), ("first_ts", 1)])
+        for bucket in cursor:
+            history.setdefault(bucket["product_id"], []).extend(bucket.get("bids", []))
     except Exception as e:
-        log.exception(f"Error logging to MongoDB: {e}")
-
-def finalize_mongo_auction(product_id, winner, final_bid):
-    try:
-        doc = active_col.find_one({"product_id": product_id})
-
-        product = products_col.find_one({"_id": ObjectId(product_id)})
-
-        # Extract metadata safely
-        product_name = product.get("name", "Unknown") if product else "Unknown"
-        auction_code = product.get("auction_code", "N/A") if product else "N/A"
-        if doc:
-            # sanitize bids and numeric fields
-            bids = doc.get("bids", [])
-            for b in bids:
-                # convert bid amounts
-                if "amount" in b:
-                    try:
-                        b["amount"] = float(b["amount"])
-                    except Exception:
-                        b["amount"] = float(str(b["amount"]))
-                # ensure bidder is a string
-                if "bidder" in b:
-                    b["bidder"] = str(b["bidder"])
-                # timestamps are fine (datetime)
-
-            doc["winner"] = str(winner)
-            doc["product_name"] = product_name
-            doc["auction_code"] = auction_code
+        log.error(f"Failed to load bid history: {e}")
+    return history
+
+def ensure_mongo_indexes():
+    """
+    Creates MONGO_INDEXES; create_index does nothing for an index that already
+    exists. Records in mongo_index_status whether each one is ready or why it
+    could not be built (e.g. duplicate keys under a unique index).
+    """
+    for collection, indexes in MONGO_INDEXES.items():
+        for keys, options in indexes:
+            name = "_".join(f"{field}_{direction}" for field, direction in keys)
             try:
-                doc["final_bid"] = float(final_bid)
-            except Exception:
-                doc["final_bid"] = float(str(final_bid))
-            doc["closed_at"] = datetime.utcnow()
-
-            # insert sanitized doc into history
-            history_col.insert_one(doc)
-            active_col.delete_one({"product_id": product_id})
-            log.info(f"Moved {product_id} → auction_history")
-
-        # remove product binary/image if you want cleanup
-        # delete_product_from_mongo(product_id)
-        products_col.update_one(
-        {"_id": ObjectId(product_id)},
-        {"$set": {
-            "status": "sold",
-            "sold_to": winner,
-            "sold_price": float(final_bid),  
-            "sold_at": datetime.utcnow()
-        }}
-    )
+                mongo_db[collection].create_index(keys, **options)
+                mongo_index_status[(collection, name)] = "ready"
+            except Exception as e:
+                mongo_index_status[(collection, name)] = str(e)
+                log.warning(f"Could not create index {name} on {collection}: {e}")
+    ready = sum(1 for status in mongo_index_status.values() if status == "ready")
+    log.info(f"MongoDB indexes: {ready} of {len(mongo_index_status)} ready")
+
+def sample_mongo_scans():
+    status = mongo_db.command("serverStatus")
+    mongo_scan_stats.update(status["metrics"]["queryExecutor"]["collectionScans"])
+
+async def mongo_stats_loop():
+    """Samples the server's collection-scan counters for /metrics; a rising count means a query lost its index."""
+    while True:
+        try:
+            await run_db("sample_mongo_scans", sample_mongo_scans)
+        except Exception as e:
+            db_log.warning("Could not sample MongoDB collection scans: %s", e)
+        await asyncio.sleep(MONGO_STATS_INTERVAL)
+
+def finalize_mongo_auctions(results):
+    """
+    Finalizes closed auctions given as [(product_id, winner, final_bid), ...].
+    Summary documents move into auction_history and the products are marked
+    sold with one query or bulk write per collection, however many auctions
+    close together. Bids stay in their bid_buckets documents, so nothing is copied.
+    """
+    if not results:
+        return
+    try:
+        closed_at = datetime.utcnow()
+        by_product = {str(product_id): (str(winner), _bid_amount(final_bid)) for product_id, winner, final_bid in results}
+        products = {
+            str(product["_id"]): product
+            for product in products_col.find(
+                {"_id": {"$in": [ObjectId(product_id) for product_id in by_product]}},
+                {"name": 1, "auction_code": 1}
+            )
+        }
+
+        history = []
+        for doc in active_col.find({"product_id": {"$in": list(by_product)}}):
+            product = products.get(doc["product_id"], {})
+            doc["winner"], doc["final_bid"] = by_product[doc["product_id"]]
+            doc["product_name"] = product.get("name", "Unknown")
+            doc["auction_code"] = product.get("auction_code", "N/A")
+            doc["closed_at"] = closed_at
+            history.append(doc)
+        if history:
+            history_col.insert_many(history, ordered=False)
+            active_col.delete_many({"product_id": {"$in": [doc["product_id"] for doc in history]}})
+            log.info(f"Moved {len(history)} auctions → auction_history")
+
+        products_col.bulk_write([
+            UpdateOne({"_id": ObjectId(product_id)}, {"$set": {
+                "status": "sold",
+                "sold_to": winner,
+                "sold_price": final_bid,
+                "sold_at": closed_at
+            }})
+            for product_id, (winner, final_bid) in by_product.items()
+        ], ordered=False)
     except Exception as e:
-        log.exception(f"Error finalizing auction: {e}")
+        log.exception(f"Error finalizing auctions: {e}")
+
+def get_image_cache():
+    global image_cache
+    if image_cache is None:
+        with _image_cache_lock:
+            if image_cache is None:
+                image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_BYTES)
+    return image_cache
 
 def save_product_to_mongo(seller, name, description, base_price, image_bytes):
     image_file_id = fs.put(image_bytes)
+    # size -> {file_id, key}; list views read these instead of the original
+    thumbnails = {}
+    for size, thumbnail in make_thumbnails(image_bytes).items():
+        key = content_key(thumbnail)
+        thumbnails[str(size)] = {"file_id": fs.put(thumbnail), "key": key}
+        get_image_cache().put(key, thumbnail)
 
     product_doc = {
         "seller": seller,
@@ -221,6 +1123,8 @@ def save_product_to_mongo(seller, name, description, base_price, image_bytes):
         "description": description,
         "base_price": base_price,
         "image_file_id": image_file_id,
+        "image_key": content_key(image_bytes),
+        "thumbnails": thumbnails,
         "ai_generated_score": None,
         "ai_flag": False,
         "created_at": datetime.utcnow(),
@@ -230,15 +1134,70 @@ def save_product_to_mongo(seller, name, description, base_price, image_bytes):
     result = products_col.insert_one(product_doc)
     return str(result.inserted_id)
 
-def get_product_from_mongo(product_id):
+def get_product_from_mongo(product_id, size=None):
+    """Returns (product, image bytes) with the image as for get_product_image(product, size)."""
     product = products_col.find_one({"_id": ObjectId(product_id)})
     if not product:
         return None
 
-    image_bytes = fs.get(product["image_file_id"]).read()
+    image_bytes = get_product_image(product, size)
 
     return product, image_bytes
 
+def get_products(product_ids, fields=PRODUCT_LIST_FIELDS):
+    """
+    Fetches product documents for many ids with one $in query and a projection.
+    Returns {product_id: doc}; malformed or unknown ids are left out.
+    """
+    object_ids = []
+    for product_id in dict.fromkeys(str(pid) for pid in product_ids if pid):
+        try:
+            object_ids.append(ObjectId(product_id))
+        except Exception:
+            continue
+    if not object_ids:
+        return {}
+    return {str(doc["_id"]): doc for doc in products_col.find({"_id": {"$in": object_ids}}, fields)}
+
+def read_gridfs_cached(file_id, key):
+    cache = get_image_cache()
+    data = cache.get(key)
+    if data is None:
+        data = fs.get(file_id).read()
+        cache.put(key, data)
+    return data
+
+def get_product_image(product, size=None):
+    """
+    Returns the image of a product document, read through the image cache: the
+    smallest thumbnail at least size pixels across, or the original when size
+    is None or larger than every thumbnail. Products uploaded before
+    thumbnails existed get theirs made from the original and cached locally.
+    """
+    # Older products have no image_key; their GridFS file never changes either
+    original_key = product.get("image_key") or f"gridfs-{product['image_file_id']}"
+    if size is not None:
+        for thumb_size in THUMBNAIL_SIZES:
+            if thumb_size < size:
+                continue
+            thumb = (product.get("thumbnails") or {}).get(str(thumb_size))
+            if thumb:
+                return read_gridfs_cached(thumb["file_id"], thumb["key"])
+            key = f"{original_key}-{thumb_size}"
+            data = get_image_cache().get(key)
+            if data is None:
+                original = read_gridfs_cached(product["image_file_id"], original_key)
+                try:
+                    data = make_thumbnail(original, thumb_size)
+                except Exception as e:
+                    log.warning(f"Could not make a thumbnail for product {product.get('_id')}: {e}")
+                    data = None
+                if data is None:
+                    return original
+                get_image_cache().put(key, data)
+            return data
+    return read_gridfs_cached(product["image_file_id"], original_key)
+
 def delete_product_from_mongo(product_id):
     try:
         doc = products_col.find_one({"_id": ObjectId(product_id)})
@@ -247,6 +1206,8 @@ def delete_product_from_mongo(product_id):
         
         try:
             fs.delete(doc["image_file_id"])
+            for thumb in (doc.get("thumbnails") or {}).values():
+                fs.delete(thumb["file_id"])
         except:
             pass
         
@@ -255,141 +1216,895 @@ def delete_product_from_mongo(product_id):
     except Exception as e:
         log.error(f"Error deleting product from MongoDB: {e}")
 
-def parse_bid_message(msg: str):
-    try:
-        msg = msg.strip()
-        # NEW HIGH BID! <amount> by <username> in <AUC-XXXX>
-        m = re.search(r'NEW\s+HIGH\s+BID!\s*([0-9]+(?:\.[0-9]+)?)\s+by\s+(.+?)\s+in\s+(AUC-[A-Z0-9]+)', msg, re.IGNORECASE)
-        if m:
-            bid = float(m.group(1))
-            bidder = m.group(2).strip()
-            auction_code = m.group(3).strip()
-            return bid, bidder, auction_code
-
-        # [JOIN] <username> joined <AUC-XXXX>
-        m2 = re.search(r'\[JOIN\]\s+(.+?)\s+joined\s+(AUC-[A-Z0-9]+)', msg, re.IGNORECASE)
-        if m2:
-            username = m2.group(1).strip()
-            auction_code = m2.group(2).strip()
-            return None, {"type": "join", "username": username, "auction_code": auction_code}, None
+class WSClient:
+    """
+    A connected browser with its own bounded send queue, drained by ws_sender(),
+    and the auction rooms it subscribed to. Compact clients get conflated
+    price frames from compact_tick_loop() instead of one frame per bid.
+    """
+    __slots__ = ("ws", "queue", "sender", "rooms", "compact")
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_MAX)
+        self.sender = None
+        self.rooms = set()
+        self.compact = False
+
+# websocket -> WSClient
+connected_websockets = {}
+# auction_code (or WS_ALL_ROOMS) -> set of subscribed WSClient
+ws_rooms = {}
+# auction_code -> encoded [auction_code, bid, bidder, ts_ms] of its latest bid this tick
+compact_dirty = {}
+ws_stats = {
+    "broadcasts": 0,
+    "last_recipients": 0,
+    "last_fanout_ms": 0.0,
+    "max_fanout_ms": 0.0,
+    "dropped_clients": 0,
+}
+# StreamWriters to the WebSocket worker processes; None unless WS_WORKERS is in effect
+ws_event_streams = None
+# Set in WebSocket worker processes, which serve clients from the event feed
+ws_worker_index = None
+# auction_code -> latest seq seen on the event feed (worker processes only)
+ws_event_seq = {}
+
+async def ws_sender(client: WSClient):
+    try:
+        while True:
+            payload = await client.queue.get()
+            await client.ws.send(payload)
+    except websockets.exceptions.ConnectionClosed:
+        pass
     except Exception as e:
-        log.warning(f"Parse error: {e} — msg: {msg}")
-    return None, None, None
+        ws_log.warning("Error sending to WebSocket: %s", e)
+    finally:
+        forget_ws_client(client)
+
+def drop_ws_client(client: WSClient):
+    """
+    Disconnects a client whose send queue is full instead of letting it hold up the others.
+    """
+    if client.ws not in connected_websockets:
+        return
+    forget_ws_client(client)
+    ws_stats["dropped_clients"] += 1
+    ws_log.warning("Dropping slow WebSocket client %s (%d updates behind)", client.ws.remote_address, WS_SEND_QUEUE_MAX)
+    if client.sender:
+        client.sender.cancel()
+    asyncio.ensure_future(client.ws.close(code=1013, reason="slow consumer"))
+
+def forget_ws_client(client: WSClient):
+    connected_websockets.pop(client.ws, None)
+    for auction_code in client.rooms:
+        unsubscribe(client, auction_code, discard=False)
+    client.rooms.clear()
+
+def subscribe(client: WSClient, auction_code: str):
+    ws_rooms.setdefault(auction_code, set()).add(client)
+    client.rooms.add(auction_code)
+
+def unsubscribe(client: WSClient, auction_code: str, discard=True):
+    room = ws_rooms.get(auction_code)
+    if room is not None:
+        room.discard(client)
+        if not room:
+            del ws_rooms[auction_code]
+    if discard:
+        client.rooms.discard(auction_code)
+
+def send_to_client(client: WSClient, msg_dict):
+    try:
+        client.queue.put_nowait(json.dumps(msg_dict, default=str))
+    except asyncio.QueueFull:
+        drop_ws_client(client)
+
+async def handle_ws_message(client: WSClient, message):
+    """
+    Handles {"action": "subscribe" | "unsubscribe", "auction_code": "AUC-XXXX"}.
+    WS_ALL_ROOMS ("*") subscribes to every auction. A subscribe is answered with
+    {"type": "snapshot", "auctions": [...]} from listener memory; later updates
+    carry a per-auction "seq" greater than the snapshot's.
+    {"action": "set_mode", "mode": "compact" | "full"} switches the update format.
+    """
+    try:
+        request = json.loads(message)
+        action = request.get("action")
+        auction_code = request.get("auction_code")
+    except Exception:
+        send_to_client(client, {"type": "error", "error": "expected a JSON object"})
+        return
+    if action == "set_mode":
+        mode = request.get("mode")
+        if mode not in ("compact", "full"):
+            send_to_client(client, {"type": "error", "error": "mode must be compact or full"})
+            return
+        client.compact = mode == "compact"
+        send_to_client(client, {"type": "mode_set", "mode": mode})
+        return
+    if action not in ("subscribe", "unsubscribe") or not isinstance(auction_code, str) or not auction_code:
+        send_to_client(client, {"type": "error", "error": "expected {action: subscribe|unsubscribe, auction_code}"})
+        return
+    if action == "unsubscribe":
+        unsubscribe(client, auction_code)
+        send_to_client(client, {"type": "unsubscribed", "auction_code": auction_code})
+        return
+
+    if ws_worker_index is not None:
+        snapshots = await fetch_worker_snapshots(auction_code)
+    else:
+        snapshots = await auction_snapshots(auction_code)
+    # No await between subscribing and queueing the snapshot: every update
+    # broadcast after this point is queued behind it
+    subscribe(client, auction_code)
+    send_to_client(client, {"type": "subscribed", "auction_code": auction_code})
+    send_to_client(client, {"type": "snapshot", "auctions": snapshots})
 
-connected_websockets = set()
+async def auction_snapshots(auction_code):
+    """Snapshots of one auction, or of every auction for WS_ALL_ROOMS."""
+    if auction_code == WS_ALL_ROOMS:
+        states = list(auction_states.values())
+    else:
+        state = await get_auction_state(auction_code)
+        states = [state] if state else []
+    return [state.snapshot() for state in states]
+
+async def fetch_worker_snapshots(auction_code):
+    """
+    Fetches snapshots from the ingest process's HTTP API. The feed and the API
+    are separate connections, so a snapshot older than an update this worker
+    already fanned out is fetched again; updates that arrive after it carry a
+    seq the client can compare against.
+    """
+    snapshots = []
+    for _ in range(WS_SNAPSHOT_ATTEMPTS):
+        try:
+            status, payload = await fetch_json(HTTP_HOST, HTTP_PORT, "/snapshots/" + quote(auction_code, safe="*"))
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            ws_log.warning("Could not fetch snapshot of %s: %s", auction_code, e)
+            return []
+        snapshots = payload.get("auctions", []) if status == 200 else []
+        if all(ws_event_seq.get(snap["auction_code"], 0) <= snap["seq"] for snap in snapshots):
+            break
+    return snapshots
 
 async def ws_handler(websocket):
-    connected_websockets.add(websocket)
+    client = WSClient(websocket)
+    client.sender = asyncio.create_task(ws_sender(client))
+    connected_websockets[websocket] = client
     remote = websocket.remote_address
-    log.info(f"WebSocket client connected from {remote}")
+    ws_log.info("WebSocket client connected from %s", remote)
     try:
         async for message in websocket:
-            log.debug(f"WS message from {remote}: {message}")
+            ws_log.debug("WS message from %s: %s", remote, message)
+            await handle_ws_message(client, message)
     except websockets.exceptions.ConnectionClosed:
         pass
     except Exception as e:
-        log.warning(f"WebSocket error: {e}")
+        ws_log.warning("WebSocket error: %s", e)
     finally:
-        connected_websockets.discard(websocket)
-        log.info(f"WebSocket client disconnected from {remote}")
+        client.sender.cancel()
+        forget_ws_client(client)
+        ws_log.info("WebSocket client disconnected from %s", remote)
 
 async def broadcast_ws(msg_dict):
-    if not connected_websockets:
+    if ws_event_streams is not None:
+        publish_ws_event(msg_dict)
+    else:
+        fan_out(msg_dict)
+
+def fan_out(msg_dict, payload=None):
+    """
+    Serializes msg_dict once (unless the encoded payload is given) and queues it
+    for every client subscribed to its auction_code (or to every auction)
+    without awaiting any send.
+    """
+    room = ws_rooms.get(msg_dict.get("auction_code"), ())
+    everyone = ws_rooms.get(WS_ALL_ROOMS, ())
+    if not room and not everyone:
         return
-    payload = json.dumps(msg_dict, default=str)
-    disconnected = set()
-    for ws in connected_websockets:
+    started = time.perf_counter()
+    if payload is None:
+        payload = json.dumps(msg_dict, default=str)
+    recipients = room | everyone if room and everyone else room or everyone
+    conflate = msg_dict.get("type") == "bid_update"
+    if conflate:
+        auction_code = msg_dict["auction_code"]
+        compact_dirty[auction_code] = json.dumps(
+            [auction_code, msg_dict["bid"], msg_dict["bidder"], int(time.time() * 1000)],
+            separators=(",", ":")
+        )
+    slow = []
+    for client in recipients:
+        if conflate and client.compact:
+            continue
         try:
-            await ws.send(payload)
-        except websockets.exceptions.ConnectionClosed:
-            disconnected.add(ws)
+            client.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            slow.append(client)
+    for client in slow:
+        drop_ws_client(client)
+    elapsed = time.perf_counter() - started
+    metric_fanout.observe(elapsed)
+    elapsed_ms = elapsed * 1000
+
+    ws_stats["broadcasts"] += 1
+    ws_stats["last_recipients"] = len(recipients)
+    ws_stats["last_fanout_ms"] = round(elapsed_ms, 3)
+    ws_stats["max_fanout_ms"] = max(ws_stats["max_fanout_ms"], ws_stats["last_fanout_ms"])
+
+async def compact_tick_loop():
+    """
+    Every COMPACT_TICK seconds, sends each compact client one frame with the
+    latest price of every subscribed auction that changed during the tick:
+    {"t": "p", "a": [[auction_code, bid, bidder, ts_ms], ...]}
+    """
+    while True:
+        await asyncio.sleep(COMPACT_TICK)
+        if not compact_dirty:
+            continue
+        dirty = compact_dirty.copy()
+        compact_dirty.clear()
+        slow = []
+        for client in connected_websockets.values():
+            if not client.compact or not client.rooms:
+                continue
+            if WS_ALL_ROOMS in client.rooms:
+                entries = list(dirty.values())
+            elif len(client.rooms) < len(dirty):
+                entries = [dirty[code] for code in client.rooms if code in dirty]
+            else:
+                entries = [entry for code, entry in dirty.items() if code in client.rooms]
+            if not entries:
+                continue
+            try:
+                client.queue.put_nowait('{"t":"p","a":[' + ",".join(entries) + "]}")
+            except asyncio.QueueFull:
+                slow.append(client)
+        for client in slow:
+            drop_ws_client(client)
+
+def publish_ws_event(msg_dict):
+    """
+    Writes one update as a JSON line to every WebSocket worker without awaiting;
+    a worker more than WS_EVENT_BUFFER_MAX bytes behind is disconnected.
+    """
+    if not ws_event_streams:
+        return
+    started = time.perf_counter()
+    line = (json.dumps(msg_dict, default=str) + "\n").encode()
+    for writer in list(ws_event_streams):
+        if writer.transport.get_write_buffer_size() > WS_EVENT_BUFFER_MAX:
+            ws_log.warning("Disconnecting WebSocket worker %d bytes behind", writer.transport.get_write_buffer_size())
+            ws_event_streams.discard(writer)
+            writer.close()
+            continue
+        writer.write(line)
+    metric_fanout.observe(time.perf_counter() - started)
+    ws_stats["broadcasts"] += 1
+
+async def serve_ws_events(reader, writer):
+    """Registers one WebSocket worker's feed connection until it goes away."""
+    ws_event_streams.add(writer)
+    log.info(f"WebSocket worker connected to the event feed ({len(ws_event_streams)} of {WS_WORKERS})")
+    try:
+        # Workers never send; this returns when the worker disconnects
+        await reader.read()
+    except OSError:
+        pass
+    finally:
+        ws_event_streams.discard(writer)
+        writer.close()
+        log.warning("WebSocket worker disconnected from the event feed")
+
+async def follow_ws_events(parent_pid):
+    """
+    Worker side of the event feed: fans every update out to this process's
+    clients. Returns once the ingest process is gone.
+    """
+    while os.getppid() == parent_pid:
+        try:
+            reader, writer = await asyncio.open_unix_connection(WS_EVENT_SOCKET)
+        except OSError:
+            await asyncio.sleep(WS_EVENT_RETRY)
+            continue
+        log.info(f"WebSocket worker {ws_worker_index} following the event feed")
+        try:
+            async for lines in read_lines(reader):
+                for line in lines:
+                    msg = json.loads(line)
+                    if "seq" in msg:
+                        ws_event_seq[msg["auction_code"]] = msg["seq"]
+                    fan_out(msg, line)
+        except OSError as e:
+            log.warning(f"Event feed error: {e}")
+        finally:
+            writer.close()
+        # Updates missed until the next connection would leave clients stale;
+        # make them reconnect and start again from a snapshot
+        log.warning(f"WebSocket worker {ws_worker_index} lost the event feed, disconnecting its clients")
+        ws_event_seq.clear()
+        for client in list(connected_websockets.values()):
+            forget_ws_client(client)
+            client.sender.cancel()
+            asyncio.ensure_future(client.ws.close(code=1012, reason="event feed lost"))
+        await asyncio.sleep(WS_EVENT_RETRY)
+
+async def ws_worker_main(parent_pid):
+    compact_task = asyncio.create_task(compact_tick_loop())
+    ws_server = await websockets.serve(ws_handler, WS_HOST, WS_PORT, reuse_port=True)
+    log.info(f"WebSocket worker {ws_worker_index} (pid {os.getpid()}) serving ws://{WS_HOST}:{WS_PORT}")
+    try:
+        await follow_ws_events(parent_pid)
+    finally:
+        compact_task.cancel()
+        ws_server.close()
+        await ws_server.wait_closed()
+
+def run_ws_worker(index, settings, parent_pid, log_level):
+    """
+    Entry point of a WebSocket worker process. settings carries the module
+    constants the ingest process runs with, which a spawned process does not inherit.
+    """
+    global ws_worker_index
+    globals().update(settings)
+    ws_worker_index = index
+    log_listener = setup_logging(log_level)
+    try:
+        asyncio.run(ws_worker_main(parent_pid))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_listener.stop()
+
+def start_ws_workers():
+    settings = {
+        name: globals()[name]
+        for name in ("WS_HOST", "WS_PORT", "HTTP_HOST", "HTTP_PORT", "WS_EVENT_SOCKET", "WS_SEND_QUEUE_MAX", "COMPACT_TICK")
+    }
+    # spawn, not fork: this process already runs DB and logging threads
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for index in range(WS_WORKERS):
+        worker = context.Process(
+            target=run_ws_worker,
+            args=(index, settings, os.getpid(), logging.getLogger().level),
+            name=f"ws-worker-{index}",
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+    return workers
+
+def get_ws_stats():
+    return dict(ws_stats, connected=len(connected_websockets), rooms=len(ws_rooms))
+
+def flush_bids(batch, replay=False):
+    """
+    Persists one flush window of queued (auction_code, product_id, bidder, bid, ts, lsn) bids.
+    MySQL only needs the highest bid per auction; Mongo keeps every bid.
+    Returns (auction codes MySQL reported as no longer active, Mongo operations dropped);
+    raises if MySQL fails.
+    """
+    latest = {}
+    for auction_code, product_id, bidder, bid, ts, lsn in batch:
+        previous = latest.get(auction_code)
+        if previous is None or bid > previous[0]:
+            latest[auction_code] = (bid, bidder)
+    started = time.perf_counter()
+    closed = update_current_bids(latest)
+    mongo_started = time.perf_counter()
+    metric_db_write["mysql"].observe(mongo_started - started)
+    dropped = log_bids_to_mongo(
+        [(product_id, bidder, bid, ts, lsn) for _, product_id, bidder, bid, ts, lsn in batch],
+        skip_logged=replay
+    )
+    metric_db_write["mongo"].observe(time.perf_counter() - mongo_started)
+    return closed, dropped
+
+def get_pipeline_stats():
+    stats = dict(pipeline_stats)
+    stats["queue_depth"] = bid_queue.qsize() if bid_queue is not None else 0
+    stats["mongo"] = dict(mongo_stats, pending_retries=len(mongo_retry_ops))
+    if bid_wal is not None:
+        stats["wal"] = {"last_lsn": bid_wal.last_lsn, "checkpoint_lsn": bid_wal.checkpoint_lsn}
+    return stats
+
+def collect_stats_metrics():
+    """Exports the stats dicts and per-call DB timings alongside the hot-path metrics."""
+    return [
+        ("listener_db_call_seconds_total", "counter", "Time spent in run_db() calls",
+         [({"call": name}, timing["total_ms"] / 1000) for name, timing in db_timings.items()]),
+        ("listener_db_calls_total", "counter", "run_db() calls",
+         [({"call": name}, timing["calls"]) for name, timing in db_timings.items()]),
+        ("listener_pipeline_events_total", "counter", "Bid pipeline events",
+         [({"event": key}, pipeline_stats[key]) for key in (
+             "flushes", "flushed_bids", "overflowed_bids", "failed_flushes", "replays", "replayed_bids",
+             "stale_bid_writes"
+         )]),
+        ("listener_mongo_ops_total", "counter", "MongoDB bid operation outcomes",
+         [({"outcome": key}, mongo_stats[key]) for key in ("failed_ops", "retried_ops", "dropped_ops")]),
+        ("listener_ws_dropped_clients_total", "counter", "WebSocket clients dropped as slow consumers",
+         [({}, ws_stats["dropped_clients"])]),
+        ("listener_mongo_index_ready", "gauge", "1 if the MongoDB index from MONGO_INDEXES is built",
+         [({"collection": collection, "index": name}, int(status == "ready"))
+          for (collection, name), status in mongo_index_status.items()]),
+        ("listener_mongo_collection_scans_total", "counter", "Collection scans reported by the MongoDB server",
+         [({"kind": kind}, count) for kind, count in mongo_scan_stats.items()]),
+    ]
+
+def metrics_api(path_parts, query):
+    return 200, "text/plain; version=0.0.4; charset=utf-8", render_metrics()
+
+gauge("listener_bid_queue_depth", "Bids waiting for the writer", lambda: bid_queue.qsize() if bid_queue is not None else 0)
+gauge("listener_ws_connections", "Connected WebSocket clients", lambda: len(connected_websockets))
+gauge("listener_ws_workers", "WebSocket worker processes connected to the event feed",
+      lambda: len(ws_event_streams) if ws_event_streams is not None else 0)
+gauge("listener_active_auctions", "Active auctions held in memory", lambda: len(auction_states))
+gauge("listener_wal_unpersisted_bids", "Bids in the WAL after its checkpoint",
+      lambda: bid_wal.last_lsn - bid_wal.checkpoint_lsn if bid_wal is not None else 0)
+register_collector(collect_stats_metrics)
+
+def request_wal_replay():
+    global wal_replay_requested
+    wal_replay_requested = True
+
+def discard_queued_bids():
+    """Empties bid_queue during a WAL replay; every queued bid is in the WAL."""
+    while True:
+        try:
+            auction_code, *_ = bid_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        remaining = unflushed_bids.pop(auction_code, 1) - 1
+        if remaining:
+            unflushed_bids[auction_code] = remaining
+
+async def replay_wal():
+    """
+    Writes every bid after the WAL checkpoint to the databases, waiting out
+    outages, and returns the last LSN written. Bids queued meanwhile are
+    discarded since the replay reaches them too.
+    """
+    loop = asyncio.get_running_loop()
+    lsn = bid_wal.checkpoint_lsn + 1
+    if lsn > bid_wal.last_lsn:
+        return bid_wal.checkpoint_lsn
+    log.warning(f"Replaying bid WAL from LSN {lsn} to {bid_wal.last_lsn}")
+    pipeline_stats["replays"] += 1
+    # Failed operations are covered by the replay
+    mongo_retry_ops.clear()
+    # Where the last batch ended in the WAL; a retried batch re-reads from its own start
+    cursor = None
+    while True:
+        discard_queued_bids()
+        bid_wal.flush()
+        if lsn > bid_wal.last_lsn:
+            log.info(f"Bid WAL replay caught up at LSN {lsn - 1}")
+            return lsn - 1
+        batch, next_cursor = await loop.run_in_executor(None, bid_wal.read_from, lsn, BID_FLUSH_SIZE, cursor)
+        if not batch:
+            log.error(f"Bid WAL has no records from LSN {lsn} to {bid_wal.last_lsn}; skipping them")
+            lsn = bid_wal.last_lsn + 1
+            cursor = None
+            continue
+        try:
+            closed, dropped = await run_db("replay_bids", flush_bids, batch, True)
         except Exception as e:
-            log.warning(f"Error sending to WebSocket: {e}")
-            disconnected.add(ws)
-    connected_websockets.difference_update(disconnected)
+            log.error(f"Bid WAL replay failed at LSN {lsn}, retrying in {WAL_REPLAY_RETRY}s: {e}")
+            await asyncio.sleep(WAL_REPLAY_RETRY)
+            continue
+        for auction_code in closed:
+            evict_auction_state(auction_code)
+        if mongo_retry_ops or dropped:
+            # Replayed bids already in their bucket are skipped on the next attempt
+            mongo_retry_ops.clear()
+            log.error(f"MongoDB rejected part of the WAL replay at LSN {lsn}, retrying in {WAL_REPLAY_RETRY}s")
+            await asyncio.sleep(WAL_REPLAY_RETRY)
+            continue
+        lsn = batch[-1][5] + 1
+        cursor = next_cursor
+        bid_wal.checkpoint(lsn - 1)
+        pipeline_stats["replayed_bids"] += len(batch)
+
+async def wal_sync_loop():
+    """
+    Group commit: one fsync every WAL_FSYNC_INTERVAL covers every bid appended
+    since the last, then the updates held for those bids are broadcast.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(WAL_FSYNC_INTERVAL)
+        synced_lsn = bid_wal.last_lsn
+        fd = bid_wal.begin_sync()
+        if fd is not None:
+            try:
+                await loop.run_in_executor(None, bid_wal.finish_sync, fd)
+            except OSError as e:
+                # Nothing is announced until a retry succeeds
+                log.error(f"Bid WAL fsync failed: {e}")
+                bid_wal.sync_failed()
+                continue
+        while held_updates and held_updates[0][0] <= synced_lsn:
+            await broadcast_ws(held_updates.popleft()[1])
+
+async def publish_update(update, lsn=None):
+    """
+    Broadcasts a monitor event once the WAL is fsynced through lsn, the LSN of
+    the bid it announces, so no pushed update announces a bid a crash could
+    lose. Snapshots and the HTTP state are not held back and may run ahead by
+    one fsync (see AuctionState). Events without a bid wait behind any held bid
+    to keep each auction's seq order.
+    """
+    if lsn is None:
+        if not held_updates:
+            await broadcast_ws(update)
+            return
+        lsn = bid_wal.last_lsn
+    held_updates.append((lsn, update))
+
+async def bid_writer_loop():
+    """
+    Drains bid_queue in batches of up to BID_FLUSH_SIZE, or whatever arrived
+    within BID_FLUSH_INTERVAL of the first bid, and persists them off the event loop.
+    A flush that fails, or a bid that did not fit in the queue, switches to
+    replaying the WAL from its checkpoint until it catches up with ingest.
+    """
+    global wal_replay_requested
+    loop = asyncio.get_running_loop()
+    # Bids left over from the last run
+    replayed_through = await replay_wal()
+    while True:
+        if wal_replay_requested:
+            wal_replay_requested = False
+            replayed_through = await replay_wal()
+            continue
+        if mongo_retry_ops:
+            # Wake up for pending Mongo retries even when no new bids arrive
+            try:
+                batch = [await asyncio.wait_for(bid_queue.get(), MONGO_RETRY_INTERVAL)]
+            except asyncio.TimeoutError:
+                batch = []
+        else:
+            batch = [await bid_queue.get()]
+        flush_at = loop.time() + BID_FLUSH_INTERVAL
+        while batch and len(batch) < BID_FLUSH_SIZE:
+            try:
+                batch.append(bid_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                remaining = flush_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(bid_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+        # Bids queued while a replay was running were written by it
+        pending = [item for item in batch if item[5] > replayed_through]
+        started = time.perf_counter()
+        try:
+            closed, dropped = await run_db("flush_bids", flush_bids, pending)
+            now = datetime.utcnow()
+            for item in pending:
+                metric_bid_persisted.observe((now - item[4]).total_seconds())
+            for auction_code in closed:
+                evict_auction_state(auction_code)
+            if dropped:
+                request_wal_replay()
+            elif pending and not mongo_retry_ops and not wal_replay_requested:
+                bid_wal.checkpoint(pending[-1][5])
+        except Exception as e:
+            bids_log.exception("Bid flush failed, replaying from the WAL: %s", e)
+            pipeline_stats["failed_flushes"] += 1
+            request_wal_replay()
+        for auction_code, *_ in batch:
+            remaining = unflushed_bids.pop(auction_code, 1) - 1
+            if remaining:
+                unflushed_bids[auction_code] = remaining
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        pipeline_stats["flushes"] += 1
+        pipeline_stats["flushed_bids"] += len(pending)
+        pipeline_stats["last_flush_size"] = len(pending)
+        pipeline_stats["last_flush_ms"] = round(elapsed_ms, 2)
+        pipeline_stats["max_flush_ms"] = max(pipeline_stats["max_flush_ms"], round(elapsed_ms, 2))
+        bids_log.debug("Flushed %d bids in %.1f ms (queue depth %d)", len(pending), elapsed_ms, bid_queue.qsize())
+
+async def read_lines(reader: asyncio.StreamReader):
+    """
+    Yields batches of decoded lines from the monitor stream.
+    Reads up to TCP_READ_SIZE bytes per wakeup and splits every complete line
+    in the chunk at once; a trailing partial line is carried over as bytes.
+    """
+    pending = b""
+    while True:
+        data = await reader.read(TCP_READ_SIZE)
+        if not data:
+            return
+        if pending:
+            data = pending + data
+        parts = data.split(b"\n")
+        pending = parts.pop()
+        if len(pending) > TCP_MAX_LINE:
+            monitor_log.warning("Dropping oversized partial line (%d bytes)", len(pending))
+            pending = b""
+        lines = [p.decode(errors="ignore").strip() for p in parts]
+        yield [line for line in lines if line]
+
+async def handle_monitor_line(msg: str):
+    monitor_log.info("[TCP BROADCAST] %s", msg)
+    started = time.perf_counter()
+    event = parse_line(msg)
+    metric_parse.observe(time.perf_counter() - started)
+    if type(event) is BidEvent:
+        bid, bidder, auction_code = event
+        state = auction_states.get(auction_code) or await get_auction_state(auction_code)
+        if state and state.current_bid is not None and bid <= state.current_bid:
+            # The server announces every parsable bid as a new high bid
+            metric_rejected_bids.inc()
+            bids_log.info("Ignoring bid %s by %s in %s: not above %s", bid, bidder, auction_code, state.current_bid)
+        elif state:
+            metric_bids.inc()
+            product_id = state.product_id
+            now = datetime.utcnow()
+            state.current_bid = bid
+            state.current_bidder = bidder
+            state.recent_bids.append((bid, bidder, now.isoformat()))
+            state.seq += 1
+            lsn = bid_wal.append(auction_code, product_id, bidder, bid, now)
+            try:
+                bid_queue.put_nowait((auction_code, product_id, bidder, bid, now, lsn))
+                unflushed_bids[auction_code] = unflushed_bids.get(auction_code, 0) + 1
+            except asyncio.QueueFull:
+                # The writer is BID_QUEUE_MAX bids behind; it picks this one up from the WAL
+                pipeline_stats["overflowed_bids"] += 1
+                request_wal_replay()
+            update = {
+                "type": "bid_update",
+                "auction_code": auction_code,
+                "product_id": product_id,
+                "bid": bid,
+                "bidder": bidder,
+                "seq": state.seq,
+                "timestamp": now.isoformat()
+            }
+            await publish_update(update, lsn)
+    elif type(event) is JoinEvent:
+        state = auction_states.get(event.auction_code) or await get_auction_state(event.auction_code)
+        join_update = {
+            "type": "user_joined",
+            "username": event.username,
+            "auction_code": event.auction_code,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if state:
+            state.occupants.add(event.username)
+            state.seq += 1
+            join_update["seq"] = state.seq
+        await publish_update(join_update)
+    elif type(event) is LeaveEvent and event.auction_code:
+        leave_update = {
+            "type": "user_left",
+            "username": event.username,
+            "auction_code": event.auction_code,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        state = auction_states.get(event.auction_code)
+        if state:
+            state.occupants.discard(event.username)
+            state.seq += 1
+            leave_update["seq"] = state.seq
+        await publish_update(leave_update)
+
+def accept_monitor_event(msg: str):
+    """
+    Strips the "#<seq> " prefix of a numbered monitor event. Returns None for an
+    event already handled before a reconnect.
+    """
+    global monitor_last_seq
+    seq_text, _, line = msg.partition(" ")
+    try:
+        seq = int(seq_text[1:])
+    except ValueError:
+        return msg
+    if seq <= monitor_last_seq:
+        return None
+    if seq > monitor_last_seq + 1:
+        monitor_log.warning("Monitor events %d to %d never arrived", monitor_last_seq + 1, seq - 1)
+        metric_missed_events.inc(seq - monitor_last_seq - 1)
+    monitor_last_seq = seq
+    if monitor_resuming:
+        metric_replayed_events.inc()
+    return line
+
+async def handle_resume_line(msg: str):
+    """
+    "[RESUME] <epoch> <from_seq>" precedes the events the server resends after
+    a reconnect, "[RESUMED] <seq>" follows them. Events between the last one
+    seen and from_seq dropped out of the server's backlog, so the auction
+    states are reconciled with the databases before the resent events apply.
+    Returns True once the resent events are done.
+    """
+    global monitor_epoch, monitor_last_seq, monitor_resuming
+    parts = msg.split()
+    if parts[0] == "[RESUMED]":
+        monitor_resuming = False
+        return True
+    try:
+        epoch, from_seq = int(parts[1]), int(parts[2])
+    except (IndexError, ValueError):
+        log.warning(f"Malformed resume line from the auction server: {msg}")
+        return False
+    if monitor_epoch is not None and epoch != monitor_epoch:
+        # A restarted server numbers from 1 again, and whatever its previous run
+        # sent after we disconnected is gone without a count
+        log.warning(
+            f"Auction server restarted (epoch {monitor_epoch} -> {epoch}) after monitor event {monitor_last_seq}; "
+            f"reconciling with the databases"
+        )
+        metric_server_restarts.inc()
+        metric_missed_events.inc(from_seq - 1)
+        await reconcile_auction_states()
+    elif monitor_epoch is not None and from_seq > monitor_last_seq + 1:
+        missed = from_seq - monitor_last_seq - 1
+        log.warning(f"{missed} monitor events were lost while disconnected; reconciling with the databases")
+        metric_missed_events.inc(missed)
+        await reconcile_auction_states()
+    monitor_epoch = epoch
+    monitor_last_seq = from_seq - 1
+    monitor_resuming = True
+    return False
+
+async def reconcile_auction_states():
+    """Reloads every active auction from MySQL when monitor events could not be backfilled."""
+    try:
+        await load_auction_states()
+    except Exception as e:
+        log.warning(f"Auction state reconciliation failed: {e}")
+
+def monitor_retry_delay(attempt: int):
+    """Full-jitter exponential backoff: 0 for the first retry, then up to MONITOR_RETRY_MAX."""
+    if attempt == 0:
+        return 0
+    return random.uniform(0, min(MONITOR_RETRY_MAX, MONITOR_RETRY_BASE * 2 ** (attempt - 1)))
 
 async def tcp_monitor_loop():
-    retry_delay = 5
+    """
+    Follows the auction server's monitor stream. A reconnect asks the server to
+    resend everything after the last numbered event seen; events it no longer
+    has are reconciled from the databases (see handle_resume_line).
+    """
+    attempt = 0
+    connected_before = False
     while True:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(10)
+        writer = None
         try:
             log.info(f"🔌 Connecting to Auction Server at {SERVER_IP}:{SERVER_PORT}...")
-            sock.connect((SERVER_IP, SERVER_PORT))
-            sock.settimeout(None)
-            sock.sendall(b"MONITOR_CLIENT\n")
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(SERVER_IP, SERVER_PORT),
+                timeout=10
+            )
+            if monitor_epoch is None:
+                writer.write(b"MONITOR_CLIENT\n")
+            else:
+                writer.write(f"MONITOR_CLIENT {monitor_epoch} {monitor_last_seq}\n".encode())
+            await writer.drain()
             log.info("Connected to Auction Server as Monitor Client")
-            buffer = ""
-            loop = asyncio.get_running_loop()
-            while True:
-                data = await loop.run_in_executor(None, sock.recv, 1024)
-                if not data:
-                    log.warning("Connection closed by server")
-                    break
-                buffer += data.decode(errors="ignore")
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    msg = line.strip()
-                    if not msg:
+            reconnected_at = None
+            if connected_before:
+                metric_reconnects.inc()
+                reconnected_at = time.perf_counter()
+                if monitor_epoch is None:
+                    # This server does not number its events; the databases are all there is
+                    await reconcile_auction_states()
+                    metric_reconcile.observe(time.perf_counter() - reconnected_at)
+                    reconnected_at = None
+            connected_before = True
+            async for lines in read_lines(reader):
+                # Only a server that talks back resets the backoff
+                attempt = 0
+                metric_lines.inc(len(lines))
+                for msg in lines:
+                    if msg[0] == "#":
+                        msg = accept_monitor_event(msg)
+                        if msg is None:
+                            continue
+                    elif msg.startswith("[RESUME"):
+                        if await handle_resume_line(msg) and reconnected_at is not None:
+                            metric_reconcile.observe(time.perf_counter() - reconnected_at)
+                            reconnected_at = None
                         continue
-                    log.info(f"[TCP BROADCAST] {msg}")
-                    bid, bidder, auction_code = parse_bid_message(msg)
-                    if bid is not None and bidder and auction_code:
-                        product_id = get_product_id_by_code(auction_code)
-                        if product_id:
-                            update_current_bid_by_code(bid, bidder, auction_code)
-                            log_bid_to_mongo(product_id, bidder, bid)
-                            update = {
-                                "type": "bid_update",
-                                "auction_code": auction_code,
-                                "product_id": product_id,
-                                "bid": bid,
-                                "bidder": bidder,
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                            await broadcast_ws(update)
-                    elif isinstance(bidder, dict) and bidder.get("type") == "join":
-                        join_update = {
-                            "type": "user_joined",
-                            "username": bidder["username"],
-                            "auction_code": bidder["auction_code"],
-                            "timestamp": datetime.utcnow().isoformat()
-                        }
-                        await broadcast_ws(join_update)
+                    await handle_monitor_line(msg)
+            log.warning("Connection closed by server")
         except ConnectionRefusedError:
-            log.error(f"Could not connect to Auction Server. Retrying in {retry_delay}s...")
-        except socket.timeout:
-            log.warning(f"Connection timeout. Retrying in {retry_delay}s...")
+            log.error("Could not connect to Auction Server")
+        except asyncio.TimeoutError:
+            log.warning("Connection timeout")
         except Exception as e:
             log.exception(f"Error in TCP monitor: {e}")
         finally:
-            try:
-                sock.close()
-            except Exception:
-                pass
-            log.info(f"🔌 Disconnected from Auction Server. Retrying in {retry_delay}s...")
+            if writer is not None:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+        retry_delay = monitor_retry_delay(attempt)
+        attempt += 1
+        log.info(f"🔌 Disconnected from Auction Server. Retrying in {retry_delay:.1f}s...")
         await asyncio.sleep(retry_delay)
 
 async def main():
-    init_db_pool()
-    log.info(f"Starting WebSocket server on ws://{WS_HOST}:{WS_PORT}")
-    ws_server = await websockets.serve(ws_handler, WS_HOST, WS_PORT)
-    log.info("WebSocket server ready")
+    global bid_queue, bid_wal, deadline_wakeup, ws_event_streams
+    deadline_wakeup = asyncio.Event()
+    bid_wal = BidWAL(WAL_DIR, WAL_SEGMENT_BYTES)
+    await run_db("init_db_pool", init_db_pool)
+    await run_db("apply_db_migrations", apply_db_migrations)
+    await load_auction_states(recent_bids=True)
+    await run_db("ensure_mongo_indexes", ensure_mongo_indexes)
+    bid_queue = asyncio.Queue(maxsize=BID_QUEUE_MAX)
+    writer_task = asyncio.create_task(bid_writer_loop())
+    wal_sync_task = asyncio.create_task(wal_sync_loop())
+    compact_task = asyncio.create_task(compact_tick_loop())
+    resync_task = asyncio.create_task(auction_resync_loop())
+    deadline_task = asyncio.create_task(deadline_loop())
+    mongo_stats_task = asyncio.create_task(mongo_stats_loop())
+    http_server = await start_http_server(
+        HTTP_HOST, HTTP_PORT, {"auctions": state_api, "snapshots": snapshot_api, "closed": closed_api, "metrics": metrics_api}
+    )
+    log.info(f"Auction state API on http://{HTTP_HOST}:{HTTP_PORT}/auctions, metrics on /metrics")
+    ws_workers = []
+    if WS_WORKERS and hasattr(socket, "SO_REUSEPORT"):
+        ws_event_streams = set()
+        if os.path.exists(WS_EVENT_SOCKET):
+            os.unlink(WS_EVENT_SOCKET)
+        ws_server = await asyncio.start_unix_server(serve_ws_events, WS_EVENT_SOCKET)
+        ws_workers = start_ws_workers()
+        log.info(f"Started {WS_WORKERS} WebSocket worker processes on ws://{WS_HOST}:{WS_PORT}, fed from {WS_EVENT_SOCKET}")
+    else:
+        if WS_WORKERS:
+            log.warning("SO_REUSEPORT is not available on this platform; serving WebSocket clients from this process")
+        log.info(f"Starting WebSocket server on ws://{WS_HOST}:{WS_PORT}")
+        ws_server = await websockets.serve(ws_handler, WS_HOST, WS_PORT)
+        log.info("WebSocket server ready")
     tcp_task = asyncio.create_task(tcp_monitor_loop())
     try:
         await tcp_task
     except asyncio.CancelledError:
         log.info("TCP monitor cancelled")
     finally:
+        writer_task.cancel()
+        wal_sync_task.cancel()
+        compact_task.cancel()
+        resync_task.cancel()
+        deadline_task.cancel()
+        mongo_stats_task.cancel()
+        http_server.close()
+        db_executor.shutdown(wait=False)
+        bid_wal.close()
+        for worker in ws_workers:
+            worker.terminate()
+        for writer in list(ws_event_streams or ()):
+            writer.close()
         ws_server.close()
         await ws_server.wait_closed()
+        for worker in ws_workers:
+            worker.join(timeout=5)
+        if ws_workers and os.path.exists(WS_EVENT_SOCKET):
+            os.unlink(WS_EVENT_SOCKET)
         log.info("Shutdown complete")
 
 
 if __name__ == "__main__":
+    log_listener = setup_logging(logging.INFO)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         log.info("\n\nShutting down gracefully...")
     except Exception as e:
-        log.exception(f" Fatal error: {e}")
\ No newline at end of file
+        log.exception(f" Fatal error: {e}")
+    finally:
+        log_listener.stop()
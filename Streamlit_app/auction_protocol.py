@@ -0,0 +1,83 @@
+"""
+Parser for the lines the C++ Auction Server sends to the monitor client:
+
+    NEW HIGH BID! <amount> by <username> in <AUC-XXXX>
+    [JOIN] <username> joined <AUC-XXXX>
+    [LEAVE] <username> left <AUC-XXXX>
+    <username> left the auction.        (room broadcast, no auction code)
+
+parse_line() dispatches on the fixed prefix/suffix of each line, splits it
+with str methods (no regex) and returns a BidEvent, JoinEvent, LeaveEvent or
+None. Names may contain spaces and even " in "/" joined "/" left ": the
+auction code ends the line and has no spaces, so it is split off at the last
+separator. The checks are only as strict as the hot path can afford: the code
+must be "AUC-" plus letters/digits and the amount a number float() accepts
+that starts with a digit; an unknown code is simply not an active auction.
+This is the innermost loop of the listener: see benchmarks/bench_parser.py
+before changing it.
+"""
+from typing import NamedTuple, Optional
+
+BID_PREFIX = "NEW HIGH BID!"
+JOIN_PREFIX = "[JOIN]"
+LEAVE_PREFIX = "[LEAVE]"
+LEAVE_SUFFIX = " left the auction."
+
+
+class BidEvent(NamedTuple):
+    bid: float
+    bidder: str
+    auction_code: str
+
+
+class JoinEvent(NamedTuple):
+    username: str
+    auction_code: str
+
+
+class LeaveEvent(NamedTuple):
+    username: str
+    # None for the room-style "left the auction." line
+    auction_code: Optional[str] = None
+
+
+_BID_START = BID_PREFIX + " "
+_JOIN_START = JOIN_PREFIX + " "
+_LEAVE_START = LEAVE_PREFIX + " "
+_BID_AMOUNT = len(_BID_START)
+_JOIN_NAME = len(_JOIN_START)
+_LEAVE_NAME = len(_LEAVE_START)
+_new_event = tuple.__new__
+
+
+def parse_line(line: str):
+    """
+    Parses one stripped monitor line; returns None for anything that is not an auction event.
+    """
+    if line.startswith(_BID_START):
+        # The amount has no spaces either, so it precedes the first " by "
+        head, _, auction_code = line.rpartition(" in ")
+        amount, _, bidder = head[_BID_AMOUNT:].partition(" by ")
+        if bidder and amount[:1].isdigit() and auction_code[:4] == "AUC-" and auction_code[4:].isalnum():
+            try:
+                return _new_event(BidEvent, (float(amount), bidder, auction_code))
+            except ValueError:
+                return None
+        return None
+    if line.startswith(_JOIN_START):
+        username, _, auction_code = line[_JOIN_NAME:].rpartition(" joined ")
+        if username and auction_code[:4] == "AUC-" and auction_code[4:].isalnum():
+            return _new_event(JoinEvent, (username, auction_code))
+        return None
+    if line.startswith(_LEAVE_START):
+        username, _, auction_code = line[_LEAVE_NAME:].rpartition(" left ")
+        if username and auction_code[:4] == "AUC-" and auction_code[4:].isalnum():
+            return _new_event(LeaveEvent, (username, auction_code))
+        return None
+    if line.startswith((BID_PREFIX, JOIN_PREFIX, LEAVE_PREFIX)):
+        # e.g. "NEW HIGH BID!" without its space: malformed, not a room leave
+        return None
+    if line.endswith(LEAVE_SUFFIX):
+        username = line[:-len(LEAVE_SUFFIX)]
+        return _new_event(LeaveEvent, (username, None)) if username else None
+    return None
@@ -8,15 +8,19 @@ from datetime import datetime
 from datetime import timezone
 import time
 # Assuming these imports work and the functions are defined elsewhere or correctly imported
-from auction_listener import finalize_mongo_auction
+from auction_listener import close_auction_records, get_bid_history
 from auction_listener import get_product_from_mongo, save_product_to_mongo, products_col
-from auction_listener import add_to_waiting_room, remove_from_waiting_room, get_waiting_users, clear_waiting_room
+from auction_listener import get_products, get_product_image, PRODUCT_LIST_FIELDS
+from auction_listener import add_to_waiting_room, remove_from_waiting_room, get_waiting_users
+from db_migrations import apply_migrations
 from bson import ObjectId
 import socket
 import random
 import string
 import os
 import queue
+import json
+import urllib.request
 from streamlit_autorefresh import st_autorefresh
 from email_sender import notify_buyers
 from urllib.parse import quote_plus, quote
@@ -34,10 +38,58 @@ DB_CONFIG = {
 SERVER_EXE = Path(r"D:\TY SEM1\CN\CP\Multithreaded-TCP-Based-Live-Auction-Server-\Server\AuctionServer.exe")
 SERVER_HOST = "127.0.0.1" 
 SERVER_PORT = 8000
+# auction_listener's in-memory state API; MySQL is used when it is unreachable
+LISTENER_API = "http://127.0.0.1:8766"
+LISTENER_API_TIMEOUT = 0.5
+# Image widths requested from get_product_image (served from thumbnails)
+THUMB_IMAGE_SIZE = 160  # list rows, shown 100-120 px wide
+CARD_IMAGE_SIZE = 480  # catalog cards
+ROOM_IMAGE_SIZE = 960  # the auction room
 
 def get_db_connection():
     return mysql.connector.connect(**DB_CONFIG)
 
+@st.cache_resource
+def ensure_schema():
+    """Applies pending MySQL migrations once per UI server process."""
+    conn = get_db_connection()
+    try:
+        return apply_migrations(conn)
+    finally:
+        conn.close()
+
+def fetch_listener_state(path: str):
+    """
+    GETs live auction state from the listener, e.g. "/auctions" or "/auctions/AUC-1A2B".
+    Returns None if the listener is down or does not know the auction.
+    """
+    try:
+        with urllib.request.urlopen(LISTENER_API + path, timeout=LISTENER_API_TIMEOUT) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+def notify_listener_closed(closed):
+    """
+    Tells the listener about auctions the UI closed itself, given as the
+    (auction_id, auction_code, product_id, winner, final_bid) tuples
+    close_auction_records() returns, so it stops serving them as active.
+    """
+    for _, auction_code, _, winner, final_bid in closed:
+        if auction_code:
+            fetch_listener_state(
+                f"/closed/{quote(auction_code)}?winner={quote_plus(str(winner))}&final_bid={final_bid}"
+            )
+
+def load_card_image(product, size):
+    """Fetches the image of a product document for a card being drawn; None if there is none."""
+    if not product:
+        return None
+    try:
+        return get_product_image(product, size)
+    except Exception:
+        return None
+
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -144,6 +196,8 @@ def insert_auction(product_id: str, product_name: str, base_price: float, durati
     conn.commit()
     conn.close()
     st.session_state.last_auction_code = auction_code
+    # Looking the code up makes the listener load the new auction right away
+    fetch_listener_state(f"/auctions/{auction_code}")
 
     # Mark product in MongoDB as in_auction
     try:
@@ -165,7 +219,10 @@ def close_expired_auctions():
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT * FROM auctions WHERE status='active'")
     active_auctions = cursor.fetchall()
+    cursor.close()
 
+    now_utc = datetime.utcnow().replace(tzinfo=timezone.utc)
+    closings = []
     for auction in active_auctions:
         start = auction.get("start_time")
         duration = auction.get("duration_minutes") or 0
@@ -177,55 +234,30 @@ def close_expired_auctions():
         if isinstance(start, str):
             start = datetime.fromisoformat(start)
 
-        # Convert to UTC
-        start_utc = start.replace(tzinfo=timezone.utc)
-        now_utc = datetime.utcnow().replace(tzinfo=timezone.utc)
-
-        # Calculate elapsed seconds
-        elapsed = (now_utc - start_utc).total_seconds()
+        # Calculate elapsed seconds in UTC
+        elapsed = (now_utc - start.replace(tzinfo=timezone.utc)).total_seconds()
 
         # Auction expired?
         if elapsed >= duration * 60:
             final_bid = float(auction.get("current_bid") or auction.get("base_price"))
-            winner = auction.get("current_bidder", "No Bids")
-
-            # Close in SQL
-            cursor.execute("""
-                UPDATE auctions 
-                SET status='closed', end_time=%s, final_bid=%s, winner=%s
-                WHERE id=%s
-            """, (datetime.utcnow(), final_bid, winner, auction["id"]))
-
-            print(f"Closed Auction {auction['id']} | Winner: {winner} | Final Bid: {final_bid}")
-
-            # Finalize in MongoDB
-            try:
-                finalize_mongo_auction(auction["product_id"], winner, float(final_bid))
-                products_col.update_one(
-                    {"_id": ObjectId(auction["product_id"])},
-                    {"$set": {
-                        "status": "sold",
-                        "sold_to": winner,
-                        "sold_price": float(final_bid),
-                        "sold_at": datetime.utcnow()
-                    }}
-                )
-            except Exception as e:
-                print("Error finalizing Mongo auction:", e)
-
-            # Remove auction row from SQL
-            cursor.execute("DELETE FROM auctions WHERE id=%s", (auction["id"],))
-            conn.commit()
+            winner = auction.get("current_bidder") or "No Bids"
+            closings.append((auction["id"], auction.get("auction_code"), auction["product_id"], winner, final_bid))
 
-            # Clear waiting room
-            try:
-                clear_waiting_room(auction.get("auction_code"))
-            except:
-                pass
+    if not closings:
+        conn.close()
+        return
 
-    conn.close()
+    # Closes in SQL, finalizes in MongoDB and clears the waiting rooms for the whole batch
+    closed = close_auction_records(closings, conn)
+    for auction_id, _, _, winner, final_bid in closed:
+        print(f"Closed Auction {auction_id} | Winner: {winner} | Final Bid: {final_bid}")
+    notify_listener_closed(closed)
 
 def get_active_auctions():
+    # A running listener closes auctions at their deadline itself
+    live = fetch_listener_state("/auctions")
+    if live is not None:
+        return live["auctions"]
     close_expired_auctions()
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
@@ -255,6 +287,9 @@ def get_seller_auctions(username):
     return rows or []
 
 def get_auction_by_id(auction_id):
+    live = fetch_listener_state(f"/auctions/id/{auction_id}")
+    if live is not None:
+        return live
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT * FROM auctions WHERE id=%s", (auction_id,))
@@ -359,6 +394,11 @@ custom_css = load_css_file("index.css")
 # 1. Page Setup
 st.set_page_config(page_title="Live Auction Management Console", layout="wide", initial_sidebar_state="expanded", menu_items={'About': 'A multi-threaded TCP-based live auction system UI.'})
 
+try:
+    ensure_schema()
+except Exception as e:
+    st.warning(f"Could not apply database migrations: {e}")
+
 # Load CSS once
 st.markdown(custom_css, unsafe_allow_html=True)
 
@@ -604,9 +644,10 @@ else:
         st.header("📋 Your Products Overview")
 
         # Load products
-        available_products = list(products_col.find({"seller": username, "status": "available"}))
-        in_auction_products = list(products_col.find({"seller": username, "status": "in_auction"}))
-        sold_products = list(products_col.find({"seller": username, "status": "sold"}))
+        seller_products = list(products_col.find({"seller": username}, PRODUCT_LIST_FIELDS))
+        available_products = [p for p in seller_products if p.get("status") == "available"]
+        in_auction_products = [p for p in seller_products if p.get("status") == "in_auction"]
+        sold_products = [p for p in seller_products if p.get("status") == "sold"]
 
         # Use tabs for a cleaner view
         tab_available, tab_in_auction, tab_sold = st.tabs([
@@ -626,11 +667,7 @@ else:
                 with cols[i % 3]: # Cycle through the columns
                     with st.container(border=True):
                         st.markdown(f"### {p.get('name')}", unsafe_allow_html=True)
-                        image_bytes = None
-                        try:
-                            _, image_bytes = get_product_from_mongo(str(p["_id"]))
-                        except Exception:
-                            pass
+                        image_bytes = load_card_image(p, CARD_IMAGE_SIZE)
 
                         if image_bytes:
                             st.image(image_bytes, caption=p.get('name'), use_container_width=True)
@@ -794,15 +831,13 @@ else:
         if not closed_auctions:
             st.info("No closed auctions yet.")
         else:
+           products = get_products(a.get("product_id") for a in closed_auctions)
            cols = st.columns(2, gap="large") 
            for i, a in enumerate(closed_auctions):
                 with cols[i % 2]:
                     with st.container(border=True):
-                        prod, image_bytes = (None, None)
-                        try:
-                            prod, image_bytes = get_product_from_mongo(a.get("product_id"))
-                        except Exception:
-                            pass
+                        prod = products.get(str(a.get("product_id")))
+                        image_bytes = load_card_image(prod, THUMB_IMAGE_SIZE)
                         
                         col_img, col_info = st.columns([1, 2])
                         with col_img:
@@ -884,12 +919,14 @@ else:
         col_code, col_button = st.columns([3, 1])
         code_input = col_code.text_input("Enter Auction Code (e.g., AUC-1A2B)", label_visibility="collapsed", placeholder="AUC-XXXX")
         if col_button.button("Join Now", use_container_width=True, type="primary"):
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM auctions WHERE auction_code=%s AND status='active'", (code_input,))
-                auction = cursor.fetchone()
-                cursor.close()
-                conn.close()
+                auction = fetch_listener_state(f"/auctions/{quote(code_input.strip())}") if code_input.strip() else None
+                if auction is None:
+                    conn = get_db_connection()
+                    cursor = conn.cursor(dictionary=True)
+                    cursor.execute("SELECT * FROM auctions WHERE auction_code=%s AND status='active'", (code_input,))
+                    auction = cursor.fetchone()
+                    cursor.close()
+                    conn.close()
                 if auction:
                     st.session_state.selected_auction = auction["id"]
                     st.session_state.in_auction_room = True
@@ -941,6 +978,7 @@ else:
             st.markdown(empty_state, unsafe_allow_html=True)
         else:
                 # Use a grid layout for better density
+                products = get_products(a.get("product_id") for a in auctions)
                 cols = st.columns(2, gap="large") 
                 for i, a in enumerate(auctions):
                     with cols[i % 2]: # Cycle between 2 columns
@@ -972,11 +1010,7 @@ else:
                                 timer = f"{mins:02d}:{secs:02d}"
                             
                             # Product info with image
-                            image_bytes = None
-                            try:
-                                _, image_bytes = get_product_from_mongo(a.get("product_id"))
-                            except Exception:
-                                pass
+                            image_bytes = load_card_image(products.get(str(a.get("product_id"))), THUMB_IMAGE_SIZE)
                             
                             col_img, col_info = st.columns([1, 2])
                             with col_img:
@@ -1179,7 +1213,7 @@ else:
          with st.container(border=True):
             image_bytes = None
             try:
-                prod, image_bytes = get_product_from_mongo(auction.get("product_id"))
+                prod, image_bytes = get_product_from_mongo(auction.get("product_id"), size=ROOM_IMAGE_SIZE)
             except Exception:
                 prod = None
                 
@@ -1324,9 +1358,11 @@ else:
             # Use st.cache_data to speed up UI loading if history is large
             @st.cache_data(ttl=60) 
             def load_history():
-                return list(db["auction_history"].find().sort("closed_at", -1))
+                history = list(db["auction_history"].find().sort("closed_at", -1))
+                # Bids are stored in bucket documents; fetch them for every listed auction at once
+                return history, get_bid_history([doc.get("product_id") for doc in history])
             
-            history = load_history()
+            history, bucket_bids = load_history()
             
             if not history:
                 st.info("No completed auction history found.")
@@ -1375,7 +1411,7 @@ else:
                         
                         # Use an expander for the individual bids
                         with st.expander("View All Bids"):
-                            bids = doc.get("bids", [])
+                            bids = doc.get("bids") or bucket_bids.get(doc.get("product_id"), [])
                             if not bids:
                                 st.write("No individual bids recorded.")
                             else:
@@ -1408,17 +1444,14 @@ else:
                 if not active_auctions:
                     st.info("No auctions are currently running.")
                 else:
+                    products = get_products(a.get("product_id") for a in active_auctions)
                     for a in active_auctions:
                         with st.container(border=True):
                             col_img, col_info, col_controls = st.columns([1, 2, 1])
                             
                             # Image column
                             with col_img:
-                                image_bytes = None
-                                try:
-                                    _, image_bytes = get_product_from_mongo(a.get("product_id"))
-                                except Exception:
-                                    pass
+                                image_bytes = load_card_image(products.get(str(a.get("product_id"))), THUMB_IMAGE_SIZE)
                                 if image_bytes:
                                     st.image(image_bytes, width=100)
                                 else:
@@ -1460,39 +1493,17 @@ else:
                                         if st.button("✅ YES", key=f"confirm_yes_{a['id']}", type="primary", use_container_width=True):
                                             # Logic to close auction early (unchanged)
                                             try:
-                                                conn = get_db_connection()
-                                                cursor = conn.cursor()
-                                                
                                                 raw = a.get("current_bid") or a.get("base_price")
                                                 final_bid = float(raw)
 
-                                                winner = a.get("current_bidder", "No Bids")
-                                                
-                                                cursor.execute("""
-                                                    UPDATE auctions 
-                                                    SET status='closed', end_time=UTC_TIMESTAMP(), final_bid=%s, winner=%s
-                                                    WHERE id=%s
-                                                """, (final_bid, winner, a["id"]))
-                                                conn.commit()
-                                                
-                                                # Finalize in MongoDB
-                                                finalize_mongo_auction(a["product_id"], winner, float(final_bid))
-                                                products_col.update_one(
-                                                    {"_id": ObjectId(a["product_id"])},
-                                                    {"$set": {
-                                                        "status": "sold",
-                                                        "sold_to": winner,
-                                                        "sold_price": float(final_bid),
-                                                        "sold_at": datetime.utcnow()
-                                                    }}
+                                                winner = a.get("current_bidder") or "No Bids"
+
+                                                # Close in SQL, finalize in MongoDB, clear the waiting room
+                                                closed = close_auction_records(
+                                                    [(a["id"], a.get("auction_code"), a["product_id"], winner, final_bid)],
+                                                    get_db_connection()
                                                 )
-                                                
-                                                # Delete from MySQL
-                                                cursor.execute("DELETE FROM auctions WHERE id=%s", (a["id"],))
-                                                conn.commit()
-                                                
-                                                # Clear waiting room
-                                                clear_waiting_room(a.get("auction_code"))
+                                                notify_listener_closed(closed)
                                                 
                                                 st.success(f"✅ Auction ended! Winner: {winner}, Final Bid: ${final_bid}")
                                                 st.session_state[end_key] = False
@@ -0,0 +1,213 @@
+"""
+Segmented append-only log of parsed bids for auction_listener.
+
+Every bid is appended here before it is queued for the databases, so a slow
+or unavailable MySQL/MongoDB never costs a bid. Records are JSON lines
+
+    [lsn, auction_code, product_id, bidder, bid, "timestamp"]
+
+with a log sequence number (LSN) that increases by one per bid. Segment files
+are named after the LSN of their first record and roll over at segment_bytes.
+checkpoint(lsn) records that everything up to lsn is in the databases and
+deletes the segments that lie entirely at or below it; read_from() feeds the
+replayer everything after the checkpoint, resuming each call at the byte
+offset the previous one stopped at.
+
+Appends are buffered in the process until flush() hands them to the OS.
+begin_sync()/finish_sync() are meant to run every few milliseconds so one
+fsync covers every bid appended since the last one; a bid is only durable,
+and should only be acknowledged to anyone, once the fsync after it finished.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".wal"
+CHECKPOINT_FILE = "checkpoint"
+
+
+class BidWAL:
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint_lsn = self._read_checkpoint()
+        self.last_lsn = self.checkpoint_lsn
+        segments = self._segments()
+        if segments:
+            self.last_lsn = max(self.last_lsn, self._recover_last_lsn(segments[-1]))
+        self._file = None
+        self._file_bytes = 0
+        self._dirty = False
+        # Appends after a restart always start a fresh segment
+        self._open_segment(self.last_lsn + 1)
+        log.info(f"Bid WAL at {directory}: checkpoint {self.checkpoint_lsn}, last LSN {self.last_lsn}")
+
+    def _segment_path(self, first_lsn):
+        return os.path.join(self.directory, f"{first_lsn:020d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        """Returns (first_lsn, path) for every segment, oldest first."""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                segments.append((int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _read_segment(path, offset=0):
+        """
+        Yields (record, offset just past it) from offset on, stopping at the
+        first torn or corrupt line.
+        """
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log.warning(f"Corrupt record in {path}, ignoring the rest of the segment")
+                    return
+                offset += len(line)
+                yield record, offset
+
+    def _recover_last_lsn(self, segment):
+        """Returns the last complete LSN in segment, cutting off a torn tail left by a crash."""
+        first_lsn, path = segment
+        last_lsn = first_lsn - 1
+        valid_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break
+                last_lsn = record[0]
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(path):
+            log.warning(f"Truncating torn tail of {path} after LSN {last_lsn}")
+            os.truncate(path, valid_bytes)
+        return last_lsn
+
+    def _open_segment(self, first_lsn):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+        self._file = open(self._segment_path(first_lsn), "ab")
+        self._file_bytes = 0
+
+    def append(self, auction_code, product_id, bidder, bid, timestamp):
+        """Appends one bid and returns its LSN."""
+        if self._file_bytes >= self.segment_bytes:
+            self._open_segment(self.last_lsn + 1)
+        self.last_lsn += 1
+        line = json.dumps(
+            [self.last_lsn, auction_code, product_id, bidder, bid, timestamp.isoformat()],
+            separators=(",", ":")
+        ).encode() + b"\n"
+        self._file.write(line)
+        self._file_bytes += len(line)
+        self._dirty = True
+        return self.last_lsn
+
+    def flush(self):
+        """Hands buffered appends to the OS so read_from() and a crash both see them."""
+        if self._dirty:
+            self._file.flush()
+
+    def sync(self):
+        """Flushes and fsyncs the open segment if anything was appended since the last sync."""
+        if self._dirty:
+            self._dirty = False
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def begin_sync(self):
+        """
+        Flushes the open segment and returns a duplicate of its descriptor for
+        finish_sync(), which may run on another thread while appends continue
+        (and even after the segment rolls over). Returns None if nothing is pending.
+        """
+        if not self._dirty:
+            return None
+        self._dirty = False
+        self._file.flush()
+        return os.dup(self._file.fileno())
+
+    def sync_failed(self):
+        """Marks the segment dirty again after a failed finish_sync(), so the next sync retries."""
+        self._dirty = True
+
+    @staticmethod
+    def finish_sync(fd):
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read_from(self, lsn, limit, cursor=None):
+        """
+        Returns (records, cursor): up to limit records with LSN >= lsn as
+        (auction_code, product_id, bidder, bid, timestamp, lsn) tuples, the
+        layout auction_listener queues bids in. Passing the returned cursor to
+        the call for the next LSN continues at the byte offset this one stopped
+        at rather than re-reading the segment from its start; a cursor for any
+        other LSN is ignored. Call flush() first.
+        """
+        records = []
+        segments = self._segments()
+        paths = [path for _, path in segments]
+        start, offset = 0, 0
+        if cursor is not None and cursor[2] == lsn and cursor[0] in paths:
+            start, offset = paths.index(cursor[0]), cursor[1]
+        position = cursor
+        for i in range(start, len(segments)):
+            path = segments[i][1]
+            if i + 1 < len(segments) and segments[i + 1][0] <= lsn:
+                offset = 0
+                continue
+            for (record_lsn, auction_code, product_id, bidder, bid, ts), end in self._read_segment(path, offset):
+                position = (path, end, record_lsn + 1)
+                if record_lsn < lsn:
+                    continue
+                records.append((auction_code, product_id, bidder, bid, datetime.fromisoformat(ts), record_lsn))
+                if len(records) >= limit:
+                    return records, position
+            offset = 0
+        return records, position
+
+    def checkpoint(self, lsn):
+        """Records that every bid up to lsn is persisted and drops the segments it covers."""
+        if lsn <= self.checkpoint_lsn:
+            return
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(str(lsn))
+        os.replace(path + ".tmp", path)
+        self.checkpoint_lsn = lsn
+
+        segments = self._segments()
+        for i, (first_lsn, segment_path) in enumerate(segments[:-1]):
+            # A segment ends right before the next one starts; never drop the open one
+            if segments[i + 1][0] - 1 <= lsn:
+                os.remove(segment_path)
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
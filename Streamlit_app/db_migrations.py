@@ -0,0 +1,179 @@
+"""
+Versioned MySQL schema migrations for the auction system.
+
+auction_listener and auction_ui call apply_migrations() at startup; every
+migration runs once per database and is recorded in schema_migrations.
+Append new migrations to MIGRATIONS with the next version number and never
+edit one that has shipped.
+
+check_query_plans() runs EXPLAIN over HOT_QUERIES, the queries the UI and
+listener run on every refresh, and reports any that no longer use their
+index, so a dropped index or a rewritten query shows up before it turns into
+a full table scan:
+
+    python db_migrations.py            apply pending migrations
+    python db_migrations.py --check    apply, then check the hot query plans
+"""
+import argparse
+import logging
+import sys
+
+import mysql.connector
+
+log = logging.getLogger(__name__)
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "123456",
+    "database": "auction_system"
+}
+
+# Serializes the listener and the UI applying migrations at the same time
+MIGRATION_LOCK = "auction_system.schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 30  # seconds
+
+
+def _index_exists(cursor, table, name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+        (table, name)
+    )
+    return cursor.fetchone() is not None
+
+
+def _add_index(cursor, table, name, columns):
+    # MySQL DDL commits implicitly, so a half-applied migration is re-run; skip what exists
+    if not _index_exists(cursor, table, name):
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+
+
+def _auction_hot_query_indexes(cursor):
+    # Listener bid updates and the UI's join-by-code lookup
+    _add_index(cursor, "auctions", "idx_auctions_code_status", ["auction_code", "status"])
+    # start_auction's "is this product already live" check
+    _add_index(cursor, "auctions", "idx_auctions_product_status", ["product_id", "status"])
+    # Seller "My Auctions", newest first
+    _add_index(cursor, "auctions", "idx_auctions_creator_start", ["created_by", "start_time"])
+    # Active auction lists and the closed-auction history, newest first
+    _add_index(cursor, "auctions", "idx_auctions_status_end", ["status", "end_time"])
+
+
+# (version, description, fn(cursor)), applied in order
+MIGRATIONS = [
+    (1, "indexes for the auctions hot queries", _auction_hot_query_indexes),
+]
+
+# name -> (query, params, index it must be able to use)
+HOT_QUERIES = {
+    "auction_by_code": (
+        "SELECT * FROM auctions WHERE auction_code=%s AND status='active'",
+        ("AUC-0000",), "idx_auctions_code_status",
+    ),
+    "auction_by_product": (
+        "SELECT * FROM auctions WHERE product_id=%s AND status='active'",
+        (0,), "idx_auctions_product_status",
+    ),
+    "seller_auctions": (
+        "SELECT * FROM auctions WHERE created_by = %s ORDER BY start_time DESC",
+        ("seller",), "idx_auctions_creator_start",
+    ),
+    "active_auctions": (
+        "SELECT * FROM auctions WHERE status='active'",
+        (), "idx_auctions_status_end",
+    ),
+    "closed_auctions": (
+        "SELECT * FROM auctions WHERE status='closed' ORDER BY end_time DESC",
+        (), "idx_auctions_status_end",
+    ),
+}
+
+
+def applied_versions(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(conn):
+    """Applies every pending migration on conn; returns the versions applied."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError(f"Timed out waiting for the schema migration lock {MIGRATION_LOCK}")
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, description, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            log.info(f"Applying schema migration {version}: {description}")
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+    return applied
+
+
+def check_query_plans(conn):
+    """
+    EXPLAINs every HOT_QUERIES entry. Returns (name, problem) pairs for queries
+    whose index is not usable or that still sort with a filesort despite it.
+    """
+    problems = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for name, (query, params, index) in HOT_QUERIES.items():
+            cursor.execute("EXPLAIN " + query, params)
+            plan = cursor.fetchall()[0]
+            possible = (plan.get("possible_keys") or "").split(",")
+            extra = plan.get("Extra") or ""
+            if index not in possible:
+                problems.append((name, f"cannot use {index} (type={plan.get('type')}, key={plan.get('key')})"))
+            elif plan.get("key") == index and "Using filesort" in extra:
+                problems.append((name, f"sorts with a filesort despite {index}"))
+    finally:
+        cursor.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the auction_system schema migrations.")
+    parser.add_argument("--check", action="store_true", help="also EXPLAIN the hot queries and fail on scans")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        applied = apply_migrations(conn)
+        log.info(f"Applied migrations {applied}" if applied else "Schema is up to date")
+        if args.check:
+            problems = check_query_plans(conn)
+            for name, problem in problems:
+                log.error(f"{name}: {problem}")
+            if problems:
+                sys.exit(1)
+            log.info(f"All {len(HOT_QUERIES)} hot queries use their indexes")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Product image thumbnails and an on-disk LRU cache in front of GridFS.
+
+make_thumbnails() renders the THUMBNAIL_SIZES variants of an uploaded image
+once, at upload time, so list views can show a few kilobytes instead of the
+full-resolution original. ImageCache keeps image bytes on local disk under a
+content key (the SHA-256 of the bytes, recorded in the product document), so a
+rerun that shows the same card reads a local file instead of streaming GridFS
+chunks. The least recently used files are removed once the cache grows past
+its byte budget.
+
+Pillow is only needed to make thumbnails; without it uploads keep just the
+original and callers fall back to it.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+log = logging.getLogger(__name__)
+
+# Longest side in pixels of the variants made at upload time
+THUMBNAIL_SIZES = (160, 480, 960)
+THUMBNAIL_QUALITY = 85
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_thumbnail(image_bytes: bytes, size: int):
+    """Returns image_bytes scaled down to fit size x size, or None without Pillow."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.thumbnail((size, size))
+        out = io.BytesIO()
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image.save(out, format="PNG", optimize=True)
+        else:
+            image.convert("RGB").save(out, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+def make_thumbnails(image_bytes: bytes):
+    """Returns {size: thumbnail bytes} for THUMBNAIL_SIZES; empty without Pillow or for an unreadable image."""
+    thumbnails = {}
+    if Image is None:
+        log.warning("Pillow is not installed; storing product images without thumbnails")
+        return thumbnails
+    try:
+        for size in THUMBNAIL_SIZES:
+            thumbnails[size] = make_thumbnail(image_bytes, size)
+    except Exception as e:
+        log.warning(f"Could not make thumbnails: {e}")
+        return {}
+    return thumbnails
+
+
+class ImageCache:
+    """
+    Files named by content key under directory, two hex characters of fan-out
+    deep. Recency is kept in memory and in each file's mtime, so a restarted
+    process evicts in roughly the same order. Safe to share between threads.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load(self):
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                st = os.stat(os.path.join(root, name))
+                found.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def get(self, key):
+        """Returns the cached bytes for key, or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            # Removed by another process sharing the directory
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,86 @@
+"""
+Minimal HTTP/1.1 GET server on asyncio streams for the listener's local
+query endpoints. Handlers are plain functions (or coroutines) mapped by the
+first path segment:
+
+    routes = {"auctions": handler}
+    handler(path_parts, query) -> (status, content_type, body)
+
+Every response closes the connection; this is for local, low-rate queries
+from the Streamlit UI and monitoring, not a general web server.
+fetch_json() is the matching client, used between listener processes.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+log = logging.getLogger(__name__)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+MAX_HEADER_LINES = 100
+
+
+def json_response(payload, status=200):
+    return status, "application/json", json.dumps(payload, default=str)
+
+
+async def _handle(reader, writer, routes):
+    status, content_type, body = 400, "text/plain", "bad request"
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        for _ in range(MAX_HEADER_LINES):
+            header = await asyncio.wait_for(reader.readline(), timeout=5)
+            if header in (b"\r\n", b"\n", b""):
+                break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) == 3:
+            method, target, _ = parts
+            url = urlsplit(target)
+            path_parts = [p for p in url.path.split("/") if p]
+            handler = routes.get(path_parts[0] if path_parts else "")
+            if method != "GET":
+                status, content_type, body = 405, "text/plain", "only GET is supported"
+            elif handler is None:
+                status, content_type, body = 404, "text/plain", "not found"
+            else:
+                result = handler(path_parts, parse_qs(url.query))
+                if asyncio.iscoroutine(result):
+                    result = await result
+                status, content_type, body = result
+    except Exception as e:
+        log.exception(f"HTTP handler error: {e}")
+        status, content_type, body = 500, "text/plain", "internal error"
+
+    data = body.encode() if isinstance(body, str) else body
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    try:
+        writer.write(head.encode() + data)
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(host: str, port: int, routes: dict):
+    return await asyncio.start_server(lambda r, w: _handle(r, w, routes), host, port)
+
+
+async def fetch_json(host: str, port: int, path: str, timeout: float = 5):
+    """GETs path from a listener HTTP server; returns (status, decoded JSON body)."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        # The server closes the connection after every response
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, json.loads(body)
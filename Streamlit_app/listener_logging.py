@@ -0,0 +1,85 @@
+"""
+Logging setup for auction_listener's event loop.
+
+setup_logging() routes every record through a QueueHandler, so the loop only
+pays for an enqueue; a QueueListener thread formats and writes to stderr.
+Per-message loggers (one bid line, one flush, one slow client) are wrapped in
+a RateLimitedLogger so a bid storm logs a bounded number of lines per second;
+the rest are only counted, then reported with the next line let through.
+
+Call sites should pass arguments instead of pre-formatting
+(log.info("bid %s", bid), not f-strings) so suppressed records are never formatted.
+"""
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s: %(message)s"
+
+
+class RateLimitedLogger(logging.LoggerAdapter):
+    """
+    Wraps a logger with a token bucket: lets through `rate` records per second
+    with bursts of up to `burst`. The check runs before a LogRecord is built,
+    so a suppressed call costs a clock read; suppressed calls are counted and
+    noted on the next record let through.
+    """
+
+    def __init__(self, logger, rate, burst):
+        super().__init__(logger, {})
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+    def isEnabledFor(self, level):
+        if not self.logger.isEnabledFor(level):
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            self.suppressed += 1
+            return False
+        self.tokens -= 1
+        return True
+
+    def process(self, msg, kwargs):
+        if self.suppressed:
+            msg = f"{msg} [{self.suppressed} similar messages suppressed]"
+            self.suppressed = 0
+        return msg, kwargs
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues the record as is. The stock QueueHandler merges msg % args before
+    enqueueing, which would put the formatting back on the event loop; the
+    queue never leaves the process, so the writer thread can do it instead.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=logging.INFO):
+    """
+    Replaces the root handlers with a queue feeding a background writer thread.
+    Returns the QueueListener; stop() it on shutdown to flush what is queued.
+    """
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(records, stream, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(records))
+    root.setLevel(level)
+
+    listener.start()
+    return listener
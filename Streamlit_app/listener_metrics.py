@@ -0,0 +1,143 @@
+"""
+In-process counters, gauges and histograms for auction_listener, rendered in
+the Prometheus text exposition format (served at /metrics by listener_http).
+
+Metrics are plain objects updated in place from the event loop: inc() and
+observe() are an attribute update and a bisect, with no locking and no
+allocation, so they can sit on the bid hot path. Gauges that mirror existing
+state take a callback evaluated only when /metrics is scraped.
+
+    lines = counter("listener_monitor_lines_total", "Lines read from the auction server")
+    lines.inc()
+    write = histogram("listener_db_write_seconds", "DB write time", store="mysql")
+    write.observe(0.004)
+"""
+from bisect import bisect_left
+
+# Seconds; spans sub-millisecond parsing up to multi-second database stalls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# name -> (type, help, [metric, ...]); one entry per label set
+_registry = {}
+# Callables returning [(name, type, help, [(labels, value), ...]), ...] at scrape time
+_collectors = []
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in sorted(labels.items())
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ("labels", "value")
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        return [f"{name}{_label_text(self.labels)} {_format_value(self.value)}"]
+
+
+class Gauge:
+    __slots__ = ("labels", "value", "fn")
+
+    def __init__(self, labels, fn=None):
+        self.labels = labels
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        value = self.fn() if self.fn is not None else self.value
+        return [f"{name}{_label_text(self.labels)} {_format_value(value)}"]
+
+
+class Histogram:
+    __slots__ = ("labels", "bounds", "counts", "sum", "count")
+
+    def __init__(self, labels, buckets=DEFAULT_BUCKETS):
+        self.labels = labels
+        self.bounds = tuple(buckets)
+        # counts[i] holds observations in (bounds[i-1], bounds[i]]; the last slot is +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            labels = dict(self.labels, le=_format_value(bound))
+            lines.append(f"{name}_bucket{_label_text(labels)} {cumulative}")
+        lines.append(f"{name}_sum{_label_text(self.labels)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_label_text(self.labels)} {self.count}")
+        return lines
+
+
+def _register(name, kind, help_text, metric):
+    entry = _registry.get(name)
+    if entry is None:
+        entry = _registry[name] = (kind, help_text, [])
+    elif entry[0] != kind:
+        raise ValueError(f"Metric {name} is already registered as a {entry[0]}")
+    entry[2].append(metric)
+    return metric
+
+
+def counter(name, help_text, **labels):
+    return _register(name, "counter", help_text, Counter(labels))
+
+
+def gauge(name, help_text, fn=None, **labels):
+    return _register(name, "gauge", help_text, Gauge(labels, fn))
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+    return _register(name, "histogram", help_text, Histogram(labels, buckets))
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+
+
+def render():
+    """Returns every registered metric in the Prometheus text format."""
+    lines = []
+    for name, (kind, help_text, metrics) in _registry.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for metric in metrics:
+            lines.extend(metric.samples(name))
+    for fn in _collectors:
+        for name, kind, help_text, values in fn():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                lines.append(f"{name}{_label_text(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,321 @@
+"""
+End-to-end load benchmark for Streamlit_app/auction_listener.py.
+
+Runs the real listener in a child process with its MySQL/MongoDB calls replaced
+by in-process stand-ins (optionally with an artificial latency), so it needs
+the Python packages from requirements.txt but no database servers. The parent
+process plays the C++ auction server's monitor connection, streaming bid lines
+at a fixed rate across --auctions auctions, and attaches --subscribers
+WebSocket clients.
+
+For each rate step it reports:
+  - WebSocket delivery latency (bid line written -> bid_update received), p50/p99
+  - persist latency (bid line read -> flush done), p50/p99 from the listener's
+    /metrics histogram, so these are bucket upper bounds
+  - the fraction of expected updates that arrived, and the queue/WAL backlog
+
+A step is sustainable when at least 99% of updates arrive, WebSocket p99 stays
+under --max-p99, no subscriber is dropped as a slow consumer and the listener
+has no persist backlog left; the highest such rate is reported as the maximum
+sustainable throughput. The load generator and the subscribers share one
+process, so very high subscriber counts measure this process as much as the
+listener.
+
+    python benchmarks/bench_load.py --rates 500,1000,2000,4000 --auctions 200 --subscribers 20
+    python benchmarks/bench_load.py --db-latency-ms 50 --subscribe one
+    python benchmarks/bench_load.py --subscribers 200 --ws-workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "Streamlit_app"
+TICK = 0.005  # seconds between generator writes
+PERSIST_METRIC = "listener_bid_persist_latency_seconds"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def auction_codes(count):
+    return [f"AUC-B{i:05d}" for i in range(count)]
+
+
+# --- child process: the real listener on stand-in databases ---
+
+def serve_listener(args):
+    sys.path.insert(0, str(APP_DIR))
+    import auction_listener as al
+
+    al.setup_logging(logging.WARNING)
+    al.SERVER_IP, al.SERVER_PORT = "127.0.0.1", args.monitor_port
+    al.WS_HOST, al.WS_PORT = "127.0.0.1", args.ws_port
+    al.HTTP_PORT = args.http_port
+    al.WAL_DIR = tempfile.mkdtemp(prefix="bench_wal_")
+    al.WS_WORKERS = args.ws_workers
+    al.WS_EVENT_SOCKET = f"{al.WAL_DIR}/events.sock"
+    db_delay = args.db_latency_ms / 1000
+
+    rows = {
+        code: {
+            "id": i + 1, "auction_code": code, "product_id": f"bench{i:05d}", "product_name": code,
+            "base_price": 1.0, "current_bid": None, "current_bidder": None,
+            "start_time": datetime.utcnow(), "duration_minutes": 24 * 60,
+        }
+        for i, code in enumerate(auction_codes(args.auctions))
+    }
+
+    def fetch_active_auction_rows(auction_codes=None, recent_bids=False):
+        return [dict(rows[code]) for code in (auction_codes or rows) if code in rows]
+
+    def update_current_bids(latest_bids):
+        time.sleep(db_delay)
+        return []
+
+    def log_bids_to_mongo(bids, skip_logged=False):
+        time.sleep(db_delay)
+        return 0
+
+    al.init_db_pool = lambda: None
+    al.apply_db_migrations = lambda: None
+    al.ensure_mongo_indexes = lambda: None
+    al.sample_mongo_scans = lambda: None
+    al.fetch_active_auction_rows = fetch_active_auction_rows
+    al.update_current_bids = update_current_bids
+    al.log_bids_to_mongo = log_bids_to_mongo
+    al.close_auction_records = lambda closings, conn=None: []
+    asyncio.run(al.main())
+
+
+# --- parent process: monitor stand-in, subscribers, reporting ---
+
+class MonitorStandIn:
+    """Accepts the listener's MONITOR_CLIENT connection and writes bid lines to it."""
+
+    def __init__(self):
+        self.writer = None
+        self.connected = asyncio.Event()
+
+    async def handle(self, reader, writer):
+        writer.write(b"Welcome to the Auction Server!\n")
+        if (await reader.readline()).strip() == b"MONITOR_CLIENT":
+            writer.write(b"Monitor mode activated. You will receive all auction updates.\n")
+            self.writer = writer
+            self.connected.set()
+
+
+class Subscriber:
+    def __init__(self, url, room):
+        self.url = url
+        self.room = room
+        self.latencies = []
+        self.received = 0
+        self.drops = 0
+
+    async def run(self, sent_at, ready):
+        """Follows self.room, reconnecting when the listener drops it as a slow consumer."""
+        import websockets
+
+        first = True
+        while True:
+            try:
+                async with websockets.connect(self.url, max_queue=None) as ws:
+                    await ws.send(json.dumps({"action": "subscribe", "auction_code": self.room}))
+                    if first:
+                        ready.release()
+                        first = False
+                    async for message in ws:
+                        now = time.perf_counter()
+                        update = json.loads(message)
+                        if update.get("type") != "bid_update":
+                            continue
+                        sent = sent_at.get(update["bidder"])
+                        if sent is not None:
+                            self.received += 1
+                            self.latencies.append(now - sent)
+            except (websockets.exceptions.ConnectionClosed, OSError):
+                # OSError: WebSocket worker processes still starting up
+                pass
+            self.drops += 1
+            await asyncio.sleep(0.1)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def scrape(http_port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{http_port}/metrics", timeout=5) as resp:
+        text = resp.read().decode()
+    buckets, gauges = {}, {}
+    for line in text.splitlines():
+        if line.startswith(PERSIST_METRIC + "_bucket"):
+            le = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets[float("inf") if le == "+Inf" else float(le)] = float(line.rsplit(" ", 1)[1])
+        elif line.startswith(("listener_bid_queue_depth", "listener_wal_unpersisted_bids")):
+            name, value = line.split(" ")
+            gauges[name] = float(value)
+    return buckets, gauges
+
+
+def histogram_percentile(before, after, fraction):
+    bounds = sorted(after)
+    counts = [after[b] - before.get(b, 0) for b in bounds]
+    total = counts[-1] if counts else 0
+    if not total:
+        return float("nan")
+    for bound, cumulative in zip(bounds, counts):
+        if cumulative >= fraction * total:
+            return bound
+    return float("inf")
+
+
+async def run_step(args, monitor, subscribers, sent_at, codes, rate):
+    for sub in subscribers:
+        sub.latencies.clear()
+        sub.received = 0
+        sub.drops = 0
+    expected = 0
+    per_code = {code: 0 for code in codes}
+    rooms = [sub.room for sub in subscribers]
+    loop = asyncio.get_running_loop()
+    persist_before, _ = await loop.run_in_executor(None, scrape, args.http_port)
+    started = loop.time()
+    sent = 0
+    seq = args.seq_start
+    while loop.time() - started < args.duration:
+        due = int((loop.time() - started) * rate)
+        if due > sent:
+            now = time.perf_counter()
+            chunk = []
+            for _ in range(due - sent):
+                seq += 1
+                code = codes[seq % len(codes)]
+                per_code[code] += 1
+                bidder = f"b{seq}"
+                sent_at[bidder] = now
+                chunk.append(f"NEW HIGH BID! {seq:f} by {bidder} in {code}\n")
+            monitor.writer.write("".join(chunk).encode())
+            await monitor.writer.drain()
+            sent = due
+        await asyncio.sleep(TICK)
+    args.seq_start = seq
+
+    for room in rooms:
+        expected += sent if room == "*" else per_code.get(room, 0)
+    # Let the pipeline and the subscribers drain
+    deadline = loop.time() + args.drain
+    while loop.time() < deadline and sum(sub.received for sub in subscribers) < expected:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+
+    persist_after, gauges = await loop.run_in_executor(None, scrape, args.http_port)
+    latencies = [lat for sub in subscribers for lat in sub.latencies]
+    received = sum(sub.received for sub in subscribers)
+    delivered = received / expected if expected else 1.0
+    backlog = gauges.get("listener_bid_queue_depth", 0) + gauges.get("listener_wal_unpersisted_bids", 0)
+    ws_p50, ws_p99 = percentile(latencies, 0.50), percentile(latencies, 0.99)
+    drops = sum(sub.drops for sub in subscribers)
+    ok = delivered >= 0.99 and ws_p99 <= args.max_p99 and backlog == 0 and not drops
+    print(
+        f"{rate:>8} {sent / args.duration:>9.0f} {delivered * 100:>7.2f}% "
+        f"{ws_p50 * 1000:>9.2f} {ws_p99 * 1000:>9.2f} "
+        f"{histogram_percentile(persist_before, persist_after, 0.50) * 1000:>10.1f} "
+        f"{histogram_percentile(persist_before, persist_after, 0.99) * 1000:>10.1f} "
+        f"{int(backlog):>8} {drops:>6}  {'ok' if ok else 'FAIL'}"
+    )
+    sent_at.clear()
+    return ok
+
+
+async def drive(args):
+    codes = auction_codes(args.auctions)
+    monitor = MonitorStandIn()
+    server = await asyncio.start_server(monitor.handle, "127.0.0.1", args.monitor_port)
+    child = subprocess.Popen([
+        sys.executable, __file__, "--serve-listener",
+        "--monitor-port", str(args.monitor_port), "--ws-port", str(args.ws_port),
+        "--http-port", str(args.http_port), "--auctions", str(args.auctions),
+        "--db-latency-ms", str(args.db_latency_ms), "--ws-workers", str(args.ws_workers),
+    ])
+    try:
+        await asyncio.wait_for(monitor.connected.wait(), timeout=30)
+        url = f"ws://127.0.0.1:{args.ws_port}"
+        subscribers = [
+            Subscriber(url, "*" if args.subscribe == "all" else codes[i % len(codes)])
+            for i in range(args.subscribers)
+        ]
+        sent_at = {}
+        ready = asyncio.Semaphore(0)
+        tasks = [asyncio.create_task(sub.run(sent_at, ready)) for sub in subscribers]
+        for _ in subscribers:
+            await asyncio.wait_for(ready.acquire(), timeout=10)
+        await asyncio.sleep(0.5)
+
+        print(f"{args.auctions} auctions, {args.subscribers} subscribers ({args.subscribe}), "
+              f"{args.duration}s per step, DB latency {args.db_latency_ms} ms, "
+              f"{args.ws_workers or 'no'} WebSocket workers")
+        print(f"{'rate/s':>8} {'sent/s':>9} {'deliv':>8} {'ws p50ms':>9} {'ws p99ms':>9} "
+              f"{'db p50ms':>10} {'db p99ms':>10} {'backlog':>8} {'drops':>6}")
+        best = None
+        args.seq_start = 0
+        for rate in args.rates:
+            if await run_step(args, monitor, subscribers, sent_at, codes, rate):
+                best = rate
+            elif args.stop_on_fail:
+                break
+        print(f"max sustainable throughput: {best if best is not None else 'none'} bids/s")
+        for task in tasks:
+            task.cancel()
+    finally:
+        child.terminate()
+        child.wait(timeout=10)
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=lambda s: [int(r) for r in s.split(",")],
+                        default=[500, 1000, 2000, 4000, 8000], help="comma-separated bids/s steps")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per rate step")
+    parser.add_argument("--drain", type=float, default=5.0, help="max seconds to wait for delivery after a step")
+    parser.add_argument("--auctions", type=int, default=100)
+    parser.add_argument("--subscribers", type=int, default=10)
+    parser.add_argument("--subscribe", choices=("all", "one"), default="all",
+                        help="each subscriber follows every auction, or one auction round-robin")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="simulated latency per stand-in DB write")
+    parser.add_argument("--max-p99", type=float, default=0.5, help="WebSocket p99 (s) a sustainable step must stay under")
+    parser.add_argument("--ws-workers", type=int, default=0, help="run the listener with this many WebSocket worker processes")
+    parser.add_argument("--stop-on-fail", action="store_true", help="stop at the first unsustainable rate")
+    parser.add_argument("--serve-listener", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--monitor-port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--ws-port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--http-port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_listener:
+        serve_listener(args)
+        return
+    args.monitor_port = args.monitor_port or free_port()
+    args.ws_port = args.ws_port or free_port()
+    args.http_port = args.http_port or free_port()
+    asyncio.run(drive(args))
+
+
+if __name__ == "__main__":
+    main()
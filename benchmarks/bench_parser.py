@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for the monitor line parser (Streamlit_app/auction_protocol.py).
+
+Runs parse_line() and the previous regex-based parser over the same corpus and
+prints the per-line cost of each. By default a synthetic corpus shaped like a
+bid storm is generated; pass --corpus to replay lines recorded from a live
+server instead, e.g.:
+
+    printf 'MONITOR_CLIENT\n' | nc 127.0.0.1 8000 > monitor_lines.txt
+    python benchmarks/bench_parser.py --corpus monitor_lines.txt
+"""
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Streamlit_app"))
+
+from auction_protocol import parse_line, BidEvent  # noqa: E402
+
+BID_RE = re.compile(r'NEW\s+HIGH\s+BID!\s*([0-9]+(?:\.[0-9]+)?)\s+by\s+(.+?)\s+in\s+(AUC-[A-Z0-9]+)', re.IGNORECASE)
+JOIN_RE = re.compile(r'\[JOIN\]\s+(.+?)\s+joined\s+(AUC-[A-Z0-9]+)', re.IGNORECASE)
+
+
+def legacy_parse(msg: str):
+    """The parse_bid_message() the listener used before auction_protocol."""
+    msg = msg.strip()
+    m = BID_RE.search(msg)
+    if m:
+        return float(m.group(1)), m.group(2).strip(), m.group(3).strip()
+    m2 = JOIN_RE.search(msg)
+    if m2:
+        return None, {"type": "join", "username": m2.group(1).strip(), "auction_code": m2.group(2).strip()}, None
+    return None, None, None
+
+
+def synthetic_corpus(size: int, auctions: int, seed: int = 7):
+    rng = random.Random(seed)
+    codes = ["AUC-" + "".join(rng.choices(string.ascii_uppercase + string.digits, k=4)) for _ in range(auctions)]
+    users = ["user_%d" % i for i in range(500)]
+    lines = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.90:
+            lines.append("NEW HIGH BID! %f by %s in %s" % (rng.uniform(1, 10000), rng.choice(users), rng.choice(codes)))
+        elif roll < 0.97:
+            lines.append("[JOIN] %s joined %s" % (rng.choice(users), rng.choice(codes)))
+        elif roll < 0.99:
+            lines.append("%s left the auction." % rng.choice(users))
+        else:
+            lines.append("Monitor mode activated. You will receive all auction updates.")
+    return lines
+
+
+def run(name, parse, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for line in lines:
+            parse(line)
+        best = min(best, time.perf_counter() - started)
+    per_line_ns = best / len(lines) * 1e9
+    print(f"{name:<10} {per_line_ns:8.1f} ns/line  {len(lines) / best / 1e6:6.2f} M lines/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="file with one recorded monitor line per line")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="synthetic corpus size")
+    parser.add_argument("--auctions", type=int, default=300, help="distinct auction codes in the synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes; the best one is reported")
+    args = parser.parse_args()
+
+    if args.corpus:
+        lines = [line.strip() for line in args.corpus.read_text(errors="ignore").splitlines() if line.strip()]
+    else:
+        lines = synthetic_corpus(args.lines, args.auctions)
+
+    # Both parsers must agree on every bid before their timings mean anything
+    for line in lines:
+        old = legacy_parse(line)
+        new = parse_line(line)
+        if old[0] is not None and new != BidEvent(*old):
+            sys.exit(f"Parsers disagree on {line!r}: {old} vs {new}")
+
+    print(f"{len(lines)} lines, best of {args.repeat}")
+    legacy = run("regex", legacy_parse, lines, args.repeat)
+    fast = run("prefix", parse_line, lines, args.repeat)
+    print(f"speedup    {legacy / fast:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Bid logging to MongoDB across failed writes, retries and WAL replays, against
+mongomock. bulk_write is emulated op by op; a collection named in
+fail_after_apply applies the batch and then raises AutoReconnect, the
+"written but never acknowledged" case that makes resends dangerous.
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+al = pytest.importorskip("auction_listener")
+
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError  # noqa: E402
+
+from bid_wal import BidWAL  # noqa: E402
+
+TS = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    db = mongomock.MongoClient()["auction_data"]
+    failures = {"fail_after_apply": set(), "fail": set()}
+
+    def bulk_write(self, ops, ordered=True):
+        if self.name in failures["fail"]:
+            raise AutoReconnect("connection refused")
+        errors = []
+        for index, op in enumerate(ops):
+            try:
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+            except DuplicateKeyError:
+                errors.append({"index": index, "code": al.DUPLICATE_KEY})
+        if self.name in failures["fail_after_apply"]:
+            raise AutoReconnect("connection reset")
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", bulk_write, raising=False)
+    monkeypatch.setattr(al, "bid_buckets_col", db["bid_buckets"])
+    monkeypatch.setattr(al, "active_col", db["active_auctions"])
+    db["active_auctions"].create_index([("product_id", 1)], unique=True)
+    monkeypatch.setattr(al, "mongo_retry_ops", [])
+    return db, failures
+
+
+def bids(product_id, lsns):
+    return [(product_id, f"u{lsn}", float(lsn), TS, lsn) for lsn in lsns]
+
+
+def logged_lsns(db, product_id="p"):
+    return sorted(b["lsn"] for bucket in db["bid_buckets"].find({"product_id": product_id}) for b in bucket["bids"])
+
+
+def summary(db, product_id="p"):
+    return db["active_auctions"].find_one({"product_id": product_id})
+
+
+def test_resent_writes_that_were_applied_do_not_duplicate(mongo):
+    db, failures = mongo
+    failures["fail_after_apply"] = {"bid_buckets", "active_auctions"}
+    al.log_bids_to_mongo(bids("p", [1, 2, 3]))
+    assert al.mongo_retry_ops
+
+    failures["fail_after_apply"] = set()
+    al.log_bids_to_mongo(bids("p", [4]))
+    al.log_bids_to_mongo([])
+
+    assert not al.mongo_retry_ops
+    assert logged_lsns(db) == [1, 2, 3, 4]
+    assert summary(db)["bid_count"] == 4
+    assert summary(db)["last_bid"] == 4.0
+    assert summary(db)["last_lsn"] == 4
+
+
+def test_failed_writes_are_retried_until_they_land(mongo):
+    db, failures = mongo
+    failures["fail"] = {"bid_buckets", "active_auctions"}
+    al.log_bids_to_mongo(bids("p", [1, 2]))
+    al.log_bids_to_mongo(bids("p", [3]))
+    assert logged_lsns(db) == []
+
+    failures["fail"] = set()
+    al.log_bids_to_mongo([])
+    al.log_bids_to_mongo([])
+
+    assert not al.mongo_retry_ops
+    assert logged_lsns(db) == [1, 2, 3]
+    assert summary(db)["bid_count"] == 3
+    assert summary(db)["last_bidder"] == "u3"
+
+
+def test_last_bid_never_moves_backwards(mongo):
+    db, _ = mongo
+    al.log_bids_to_mongo([("p", "hi", 50.0, TS, 2)])
+    al.log_bids_to_mongo([("p", "lo", 10.0, TS, 3)])
+    assert summary(db)["last_bid"] == 50.0
+
+
+def test_replay_rebuilds_a_summary_lost_with_the_retries(mongo):
+    db, failures = mongo
+    failures["fail"] = {"active_auctions"}
+    al.log_bids_to_mongo(bids("p", [1, 2]))
+    failures["fail"] = set()
+    # A WAL replay (or a restart) drops the pending summary
+    al.mongo_retry_ops.clear()
+
+    al.log_bids_to_mongo(bids("p", [1, 2]), skip_logged=True)
+
+    assert logged_lsns(db) == [1, 2]
+    assert summary(db)["bid_count"] == 2
+    assert summary(db)["last_lsn"] == 2
+
+
+def test_replay_of_logged_and_summarized_bids_changes_nothing(mongo):
+    db, _ = mongo
+    al.log_bids_to_mongo(bids("p", [1, 2, 3]) + bids("q", [4]))
+    before = summary(db)
+
+    al.log_bids_to_mongo(bids("p", [1, 2, 3]) + bids("q", [4]), skip_logged=True)
+
+    assert logged_lsns(db) == [1, 2, 3]
+    assert logged_lsns(db, "q") == [4]
+    assert summary(db)["bid_count"] == before["bid_count"] == 3
+    assert summary(db, "q")["bid_count"] == 1
+
+
+def test_replay_counts_only_bids_past_the_stored_summary(mongo):
+    db, failures = mongo
+    al.log_bids_to_mongo(bids("p", [1, 2]))
+    failures["fail"] = {"active_auctions"}
+    al.log_bids_to_mongo(bids("p", [3, 4]))
+    failures["fail"] = set()
+    al.mongo_retry_ops.clear()
+
+    al.log_bids_to_mongo(bids("p", [1, 2, 3, 4, 5]), skip_logged=True)
+
+    assert logged_lsns(db) == [1, 2, 3, 4, 5]
+    assert summary(db)["bid_count"] == 5
+    assert summary(db)["last_lsn"] == 5
+
+
+def test_replay_wal_persists_the_backlog_and_checkpoints(mongo, tmp_path, monkeypatch):
+    db, _ = mongo
+    # One segment, so the checkpoint below deletes nothing and the rerun sees every bid
+    wal = BidWAL(str(tmp_path))
+    for lsn in range(1, 121):
+        wal.append("AUC-1", "p", f"u{lsn}", float(lsn), TS)
+    monkeypatch.setattr(al, "bid_wal", wal)
+    monkeypatch.setattr(al, "BID_FLUSH_SIZE", 25)
+    written = []
+    monkeypatch.setattr(al, "update_current_bids", lambda latest: written.append(latest) or [])
+
+    async def replay():
+        monkeypatch.setattr(al, "bid_queue", asyncio.Queue())
+        return await al.replay_wal()
+
+    assert asyncio.run(replay()) == 120
+    assert wal.checkpoint_lsn == 120
+    assert written[-1] == {"AUC-1": (120.0, "u120")}
+    assert logged_lsns(db) == list(range(1, 121))
+    assert summary(db)["bid_count"] == 120
+
+    # Replaying the same bids again, as after a crash before the checkpoint, is harmless
+    wal.checkpoint_lsn = 0
+    assert asyncio.run(replay()) == 120
+    assert logged_lsns(db) == list(range(1, 121))
+    assert summary(db)["bid_count"] == 120
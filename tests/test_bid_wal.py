@@ -0,0 +1,126 @@
+import os
+from datetime import datetime
+
+from bid_wal import BidWAL, SEGMENT_SUFFIX
+
+TS = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def fill(wal, count, start=0):
+    for i in range(start, start + count):
+        wal.append(f"AUC-{i % 7}", f"p{i % 7}", f"u{i}", float(i), TS)
+    wal.flush()
+
+
+def read_all(wal, lsn=1, limit=50, use_cursor=True):
+    lsns, cursor = [], None
+    while True:
+        batch, next_cursor = wal.read_from(lsn, limit, cursor if use_cursor else None)
+        if not batch:
+            return lsns
+        lsns.extend(record[5] for record in batch)
+        lsn, cursor = batch[-1][5] + 1, next_cursor
+
+
+def segment_names(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+def test_segments_roll_over_and_read_back_in_order(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=2048)
+    fill(wal, 300)
+    assert len(segment_names(tmp_path)) > 3
+    assert read_all(wal) == list(range(1, 301))
+    code, product_id, bidder, bid, ts, lsn = wal.read_from(5, 1)[0][0]
+    assert (code, product_id, bidder, bid, ts, lsn) == ("AUC-4", "p4", "u4", 4.0, TS, 5)
+
+
+def test_cursor_resume_matches_reading_from_the_start(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=2048)
+    fill(wal, 300)
+    assert read_all(wal, use_cursor=True) == read_all(wal, use_cursor=False)
+
+
+def test_cursor_follows_appends_and_rollover(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=2048)
+    fill(wal, 10)
+    batch, cursor = wal.read_from(1, 100)
+    assert [r[5] for r in batch] == list(range(1, 11))
+    fill(wal, 200, start=10)
+    batch, _ = wal.read_from(11, 500, cursor)
+    assert [r[5] for r in batch] == list(range(11, 211))
+
+
+def test_cursor_for_another_lsn_or_deleted_segment_is_ignored(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=2048)
+    fill(wal, 300)
+    _, cursor = wal.read_from(1, 100)
+    batch, _ = wal.read_from(150, 3, cursor)
+    assert [r[5] for r in batch] == [150, 151, 152]
+    wal.checkpoint(100)
+    batch, _ = wal.read_from(101, 3, cursor)
+    assert [r[5] for r in batch] == [101, 102, 103]
+
+
+def test_torn_tail_is_truncated_on_reopen(tmp_path):
+    wal = BidWAL(str(tmp_path))
+    fill(wal, 5)
+    wal._file.write(b'[6,"AUC-1","p1"')
+    wal._file.flush()
+    torn = os.path.join(tmp_path, segment_names(tmp_path)[-1])
+    size = os.path.getsize(torn)
+    wal._file.close()
+    wal._file = None
+
+    reopened = BidWAL(str(tmp_path))
+    assert reopened.last_lsn == 5
+    assert os.path.getsize(torn) < size
+    assert read_all(reopened) == [1, 2, 3, 4, 5]
+    assert reopened.append("AUC-1", "p1", "u", 9.0, TS) == 6
+
+
+def test_read_stops_at_a_corrupt_record(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=1 << 20)
+    fill(wal, 3)
+    wal._file.write(b"not json\n")
+    fill(wal, 2, start=3)
+    assert read_all(wal) == [1, 2, 3]
+
+
+def test_checkpoint_drops_covered_segments_but_keeps_the_open_one(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=2048)
+    fill(wal, 300)
+    before = segment_names(tmp_path)
+    wal.checkpoint(wal.last_lsn)
+    after = segment_names(tmp_path)
+    assert after == before[-1:]
+    assert wal.read_from(wal.last_lsn + 1, 10)[0] == []
+
+    reopened = BidWAL(str(tmp_path), segment_bytes=2048)
+    assert reopened.checkpoint_lsn == 300
+    assert reopened.last_lsn == 300
+
+
+def test_checkpoint_keeps_segments_with_unpersisted_bids(tmp_path):
+    wal = BidWAL(str(tmp_path), segment_bytes=2048)
+    fill(wal, 300)
+    wal.checkpoint(150)
+    wal.checkpoint(100)
+    assert wal.checkpoint_lsn == 150
+    assert read_all(wal, lsn=151) == list(range(151, 301))
+    first_lsn = int(segment_names(tmp_path)[0][:-len(SEGMENT_SUFFIX)])
+    assert first_lsn <= 151
+
+
+def test_begin_sync_only_when_dirty(tmp_path):
+    wal = BidWAL(str(tmp_path))
+    assert wal.begin_sync() is None
+    fill(wal, 1)
+    fd = wal.begin_sync()
+    assert fd is not None
+    BidWAL.finish_sync(fd)
+    assert wal.begin_sync() is None
+    wal.sync_failed()
+    fd = wal.begin_sync()
+    assert fd is not None
+    BidWAL.finish_sync(fd)